@@ -1,25 +1,178 @@
 from functools import wraps
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Optional, Tuple
 
+import numpy as np
+from sc2.position import Point2
+from sc2.units import Units
 
-def property_cache_once_per_frame(f):
+
+class FrozenUnits(Units):
+    """
+    `Units` that can't be modified, returned by the frame cache so every caller can share
+    one result without copying it. Selectors (`filter`, `ready`, `copy` etc) return normal `Units`
+    """
+
+    def _frozen(self, *args, **kwargs):
+        raise TypeError(
+            "Cached Units are read only, call `.copy()` to get a mutable collection"
+        )
+
+    append = extend = insert = remove = pop = clear = sort = reverse = _frozen
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _frozen
+
+
+class FrameCacheStats:
+    def __init__(self) -> None:
+        self.hits: int = 0
+        self.misses: int = 0
+        # values that had to be copied when cached, because they couldn't be frozen in place
+        self.copies: int = 0
+        # entries dropped because a memo hit its size limit
+        self.evictions: int = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"FrameCacheStats(hits={self.hits}, misses={self.misses}, "
+            f"copies={self.copies}, evictions={self.evictions})"
+        )
+
+
+# key: qualified property name, ie: "BaseUnit.enemy_air_threats"
+FRAME_CACHE_STATS: Dict[str, FrameCacheStats] = {}
+
+
+def freeze(value: Any, stats: Optional[FrameCacheStats] = None) -> Any:
+    """
+    Read only version of `value` that can be shared between callers
+    Arrays become read only views, `Units` are copied once into `FrozenUnits`
+    """
+    if isinstance(value, FrozenUnits):
+        return value
+    if isinstance(value, Units):
+        if stats is not None:
+            stats.copies += 1
+        return FrozenUnits(value, value._bot_object)
+    if isinstance(value, np.ndarray):
+        view: np.ndarray = value.view()
+        view.flags.writeable = False
+        return view
+    if isinstance(value, set):
+        if stats is not None:
+            stats.copies += 1
+        return frozenset(value)
+    if isinstance(value, list):
+        if stats is not None:
+            stats.copies += 1
+        return tuple(value)
+    if isinstance(value, dict):
+        return MappingProxyType(value)
+    return value
+
+
+def invalidate_frame_cache(instance: Any, name: Optional[str] = None) -> None:
+    """
+    Clear cached values on `instance` mid frame, ie: after something it depends on changed
+    @param instance: owner of the cached properties
+    @param name: property name to clear, or `None` for all of them
+    """
+    cache: Optional[Dict[str, Tuple[int, Any]]] = instance.__dict__.get("_frame_cache")
+    if cache is None:
+        return
+    if name is None:
+        cache.clear()
+    else:
+        cache.pop(name, None)
+
+
+def property_cache_once_per_frame(f: Callable) -> property:
     """This decorator caches the return value for one game loop,
     then clears it if it is accessed in a different game loop.
-    Only works on properties of the bot object, because it requires
-    access to self.state.game_loop"""
+    Values are cached per instance, and returned frozen (see `freeze`) rather than copied.
+    Only works on objects with a `bot` attribute, because it requires
+    access to self.bot.state.game_loop"""
+    name: str = f.__name__
+    stats: FrameCacheStats = FRAME_CACHE_STATS.setdefault(
+        f.__qualname__, FrameCacheStats()
+    )
 
     @wraps(f)
     def inner(self):
-        property_cache = "_cache_" + f.__name__
-        state_cache = "_frame_" + f.__name__
-        cache_updated = getattr(self.bot, state_cache, -1) == self.bot.state.game_loop
-        if not cache_updated:
-            setattr(self.bot, property_cache, f(self))
-            setattr(self.bot, state_cache, self.bot.state.game_loop)
-
-        cache = getattr(self.bot, property_cache)
-        should_copy = callable(getattr(cache, "copy", None))
-        if should_copy:
-            return cache.copy()
-        return cache
+        game_loop: int = self.bot.state.game_loop
+        cache: Dict[str, Tuple[int, Any]] = self.__dict__.setdefault("_frame_cache", {})
+        cached: Optional[Tuple[int, Any]] = cache.get(name)
+        if cached is not None and cached[0] == game_loop:
+            stats.hits += 1
+            return cached[1]
+
+        stats.misses += 1
+        value: Any = freeze(f(self), stats)
+        cache[name] = (game_loop, value)
+        return value
 
+    inner.stats = stats
     return property(inner)
+
+
+def snap_to_grid(position: Point2, resolution: float) -> Point2:
+    """Closest point to `position` on a grid with `resolution` spacing"""
+    return Point2(
+        (
+            round(position[0] / resolution) * resolution,
+            round(position[1] / resolution) * resolution,
+        )
+    )
+
+
+def method_cache_once_per_frame(
+    resolution: float = 1.0, max_size: int = 2048
+) -> Callable[[Callable], Callable]:
+    """
+    Like `property_cache_once_per_frame`, but for methods that take arguments
+    `Point2` arguments are snapped to a grid of `resolution` (see `snap_to_grid`),
+    and the method is called with the snapped positions so the result doesn't depend
+    on which nearby position was asked about first
+    Holds at most `max_size` results per instance, oldest results are dropped first
+    Use `invalidate_frame_cache` if something the method depends on changes mid frame
+    @param resolution: grid spacing Point2 arguments are snapped to
+    @param max_size: most results kept per instance each frame
+    """
+
+    def decorator(f: Callable) -> Callable:
+        name: str = f.__name__
+        stats: FrameCacheStats = FRAME_CACHE_STATS.setdefault(
+            f.__qualname__, FrameCacheStats()
+        )
+
+        @wraps(f)
+        def inner(self, *args):
+            game_loop: int = self.bot.state.game_loop
+            cache: Dict[str, Tuple[int, Any]] = self.__dict__.setdefault(
+                "_frame_cache", {}
+            )
+            cached: Optional[Tuple[int, Any]] = cache.get(name)
+            if cached is None or cached[0] != game_loop:
+                cached = (game_loop, {})
+                cache[name] = cached
+            memo: Dict[Tuple, Any] = cached[1]
+
+            args = tuple(
+                snap_to_grid(arg, resolution) if isinstance(arg, Point2) else arg
+                for arg in args
+            )
+            if args in memo:
+                stats.hits += 1
+                return memo[args]
+
+            stats.misses += 1
+            if len(memo) >= max_size:
+                del memo[next(iter(memo))]
+                stats.evictions += 1
+            value: Any = f(self, *args)
+            memo[args] = value
+            return value
+
+        inner.stats = stats
+        return inner
+
+    return decorator
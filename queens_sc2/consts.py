@@ -1,5 +1,7 @@
-from typing import Set
+from typing import Iterable, Set
 from enum import Enum, auto
+
+import numpy as np
 from sc2.ids.unit_typeid import UnitTypeId as UnitID
 
 CREEP_POLICY: str = "creep_policy"
@@ -8,6 +10,8 @@ DEFENCE_POLICY: str = "defence_policy"
 INJECT_POLICY: str = "inject_policy"
 NYDUS_POLICY: str = "nydus_policy"
 QUEEN_TURN_RATE: float = 999.8437
+# game loops per in game second on faster speed
+GAME_LOOPS_PER_SECOND: float = 22.4
 
 
 class QueenRoles(Enum):
@@ -147,6 +151,67 @@ UNITS_TO_TRANSFUSE: Set[UnitID] = {
     UnitID.NYDUSNETWORK,
 }
 
+EXCLUDE_AIR_THREATS: Set[UnitID] = {UnitID.OVERLORD, UnitID.OVERSEER, UnitID.OBSERVER}
+EXCLUDE_FROM_ATTACK_TARGETS: Set[UnitID] = {UnitID.MULE, UnitID.EGG, UnitID.LARVA}
+EXCLUDE_FROM_POS_NEAR_ENEMY: Set[UnitID] = {
+    UnitID.DRONE,
+    UnitID.SCV,
+    UnitID.PROBE,
+    UnitID.CHANGELING,
+    UnitID.CHANGELINGMARINE,
+    UnitID.CHANGELINGZERGLING,
+    UnitID.CHANGELINGZERGLINGWINGS,
+    UnitID.CHANGELINGZEALOT,
+    UnitID.CHANGELINGMARINESHIELD,
+    UnitID.OVERLORD,
+    UnitID.OVERSEER,
+    UnitID.OBSERVER,
+}
+ALL_TUMOR_TYPES: Set[UnitID] = {
+    UnitID.CREEPTUMORBURROWED,
+    UnitID.CREEPTUMORQUEEN,
+    UnitID.CREEPTUMOR,
+}
+STATIC_DEFENCE: Set[UnitID] = {
+    UnitID.BUNKER,
+    UnitID.PHOTONCANNON,
+    UnitID.PLANETARYFORTRESS,
+    UnitID.SHIELDBATTERY,
+    UnitID.SPINECRAWLER,
+}
+
+# boolean lookup tables indexed by `UnitTypeId.value`, so a whole array of type ids
+# can be checked against a set of types in one go, see `type_id_mask`
+# the last entry is always False, any unknown type id is clipped onto it
+TYPE_ID_LUT_SIZE: int = max(type_id.value for type_id in UnitID) + 2
+
+
+def type_id_lut(types: Iterable[UnitID]) -> np.ndarray:
+    """Lookup table that is True at the value of every type in `types`"""
+    lut: np.ndarray = np.zeros(TYPE_ID_LUT_SIZE, dtype=bool)
+    lut[[type_id.value for type_id in types]] = True
+    lut.flags.writeable = False
+    return lut
+
+
+def type_id_mask(lut: np.ndarray, type_ids: np.ndarray) -> np.ndarray:
+    """True for every entry of `type_ids` (`UnitTypeId` values) that is set in `lut`"""
+    return lut[np.minimum(type_ids, TYPE_ID_LUT_SIZE - 1)]
+
+
+ALL_STRUCTURES_LUT: np.ndarray = type_id_lut(ALL_STRUCTURES)
+CHANGELING_TYPES_LUT: np.ndarray = type_id_lut(CHANGELING_TYPES)
+GROUND_TOWNHALL_TYPES_LUT: np.ndarray = type_id_lut(GROUND_TOWNHALL_TYPES)
+UNITS_TO_TRANSFUSE_LUT: np.ndarray = type_id_lut(UNITS_TO_TRANSFUSE)
+EXCLUDE_AIR_THREATS_LUT: np.ndarray = type_id_lut(EXCLUDE_AIR_THREATS)
+EXCLUDE_FROM_ATTACK_TARGETS_LUT: np.ndarray = type_id_lut(EXCLUDE_FROM_ATTACK_TARGETS)
+EXCLUDE_FROM_POS_NEAR_ENEMY_LUT: np.ndarray = type_id_lut(EXCLUDE_FROM_POS_NEAR_ENEMY)
+STATIC_DEFENCE_LUT: np.ndarray = type_id_lut(STATIC_DEFENCE)
+# attack targets for queens that shouldn't go after static defence
+EXCLUDE_FROM_ATTACK_TARGETS_AND_STATIC_DEFENCE_LUT: np.ndarray = type_id_lut(
+    EXCLUDE_FROM_ATTACK_TARGETS | STATIC_DEFENCE
+)
+
 
 class QueenPolicyKeys(Enum):
     CreepQueens = "creep_queens"
@@ -0,0 +1,244 @@
+from math import ceil, floor
+from typing import Optional, Set, Tuple
+
+import numpy as np
+from sc2.bot_ai import BotAI
+from sc2.pixel_map import PixelMap
+from scipy.spatial import cKDTree
+
+
+class TileSet:
+    """
+    (x, y) of a set of tiles, kept as a compact array that tiles can be added to and removed from
+    without rebuilding it. Removed tiles are filled by tiles from the end, so order isn't kept
+    """
+
+    def __init__(self, shape: Tuple[int, int]) -> None:
+        # index of each tile in `tiles`, -1 if it isn't in the set
+        self.slots: np.ndarray = np.full(shape, -1, dtype=np.int64)
+        self._tiles: np.ndarray = np.empty((64, 2), dtype=int)
+        self.amount: int = 0
+
+    @property
+    def tiles(self) -> np.ndarray:
+        """
+        (x, y) of every tile in the set, as a read only view
+        The view is changed in place by the next `add` or `remove`, copy it to keep it
+        """
+        view: np.ndarray = self._tiles[: self.amount]
+        view.flags.writeable = False
+        return view
+
+    def reset(self, mask: np.ndarray) -> None:
+        """Replace the set with the tiles where `mask` is True"""
+        self.slots.fill(-1)
+        self.amount = 0
+        self.add(mask)
+
+    def add(self, mask: np.ndarray) -> None:
+        """Add the tiles where `mask` is True, they must not be in the set already"""
+        ys, xs = np.nonzero(mask)
+        if ys.shape[0] == 0:
+            return
+        new_amount: int = self.amount + ys.shape[0]
+        if new_amount > self._tiles.shape[0]:
+            tiles: np.ndarray = np.empty(
+                (max(new_amount, 2 * self._tiles.shape[0]), 2), dtype=int
+            )
+            tiles[: self.amount] = self._tiles[: self.amount]
+            self._tiles = tiles
+        self._tiles[self.amount : new_amount, 0] = xs
+        self._tiles[self.amount : new_amount, 1] = ys
+        self.slots[ys, xs] = np.arange(self.amount, new_amount)
+        self.amount = new_amount
+
+    def remove(self, mask: np.ndarray) -> None:
+        """Remove the tiles where `mask` is True, they must be in the set"""
+        removed: np.ndarray = self.slots[mask]
+        if removed.shape[0] == 0:
+            return
+        self.slots[mask] = -1
+        new_amount: int = self.amount - removed.shape[0]
+        # tiles past the new end that are staying move into the gaps left before it
+        is_removed: np.ndarray = np.zeros(self.amount - new_amount, dtype=bool)
+        is_removed[removed[removed >= new_amount] - new_amount] = True
+        movers: np.ndarray = np.flatnonzero(~is_removed) + new_amount
+        gaps: np.ndarray = removed[removed < new_amount]
+        self._tiles[gaps] = self._tiles[movers]
+        self.slots[self._tiles[gaps, 1], self._tiles[gaps, 0]] = gaps
+        self.amount = new_amount
+
+
+class FrontierIndex:
+    """
+    Closest tile lookups for a mask of tiles, using a tree over only the tiles on its border
+    The closest tile in the mask to a position is either on the border of the mask,
+    or one of the (up to 4) tiles less than a tile away from the position on both axes,
+    so checking both gives the same answer as searching every tile
+    """
+
+    def __init__(self, mask: np.ndarray) -> None:
+        self.mask: np.ndarray = mask
+        inner: np.ndarray = mask.copy()
+        inner[1:, :] &= mask[:-1, :]
+        inner[:-1, :] &= mask[1:, :]
+        inner[:, 1:] &= mask[:, :-1]
+        inner[:, :-1] &= mask[:, 1:]
+        # tiles on the map edge count as border tiles
+        inner[[0, -1], :] = False
+        inner[:, [0, -1]] = False
+        ys, xs = np.nonzero(mask & ~inner)
+        # (x, y) of every border tile
+        self.tiles: np.ndarray = np.column_stack((xs, ys))
+        self.tree: Optional[cKDTree] = cKDTree(self.tiles) if xs.shape[0] else None
+
+    @property
+    def amount(self) -> int:
+        return self.tiles.shape[0]
+
+    def closest_tile(self, x: float, y: float) -> Optional[Tuple[int, int]]:
+        """(x, y) of the tile in the mask closest to the position, `None` if the mask is empty"""
+        if self.tree is None:
+            return None
+        distance, index = self.tree.query((x, y))
+        closest_x, closest_y = self.tiles[index].tolist()
+        closest_distance: float = distance * distance
+
+        height, width = self.mask.shape
+        xs: Set[int] = {floor(x), ceil(x)}
+        ys: Set[int] = {floor(y), ceil(y)}
+        for tile_x in xs:
+            for tile_y in ys:
+                if not (0 <= tile_x < width and 0 <= tile_y < height):
+                    continue
+                if not self.mask[tile_y, tile_x]:
+                    continue
+                tile_distance: float = (tile_x - x) ** 2 + (tile_y - y) ** 2
+                if tile_distance < closest_distance:
+                    closest_x, closest_y = tile_x, tile_y
+                    closest_distance = tile_distance
+        return closest_x, closest_y
+
+
+class CreepGrid:
+    """
+    Creep and no creep tiles for the current game loop
+    Can be shared by several `Creep` controllers, `update` only does the work once per game loop
+
+    With `incremental` set, the creep and no creep tile arrays are patched with just the tiles
+    that changed since the last update (found by xor-ing the creep grids), rather than rebuilt
+    """
+
+    def __init__(self, bot: BotAI, incremental: bool = False) -> None:
+        self.bot: BotAI = bot
+        self.incremental: bool = incremental
+        self.game_loop: int = -1
+        # (x, y) of every creep tile
+        self.creep_map: np.ndarray = np.empty((0, 2), dtype=int)
+        # (x, y) of every pathable tile without creep
+        self.no_creep_map: np.ndarray = np.empty((0, 2), dtype=int)
+        # pathable tiles, and how many of them have creep
+        self.pathable_tile_count: int = 0
+        self.creep_tile_count: int = 0
+        # tiles that changed in the last incremental update
+        self.changed_tile_count: int = 0
+        # masks of the tiles in `creep_map` and `no_creep_map`
+        self.creep_mask: Optional[np.ndarray] = None
+        self.no_creep_mask: Optional[np.ndarray] = None
+        self._creep_frontier: Optional[FrontierIndex] = None
+        self._no_creep_frontier: Optional[FrontierIndex] = None
+
+        self._creep_tiles: Optional[TileSet] = None
+        self._no_creep_tiles: Optional[TileSet] = None
+        self._pathing_grid: Optional[PixelMap] = None
+        self._pathable: Optional[np.ndarray] = None
+
+    @property
+    def creep_coverage(self) -> float:
+        """Percentage of pathable tiles with creep, as of the last `update`"""
+        if self.pathable_tile_count:
+            return 100 * self.creep_tile_count / self.pathable_tile_count
+
+        return 0.0
+
+    @property
+    def creep_frontier(self) -> FrontierIndex:
+        """Closest creep tile lookups, built the first time it is needed after the creep changes"""
+        if self._creep_frontier is None:
+            self._creep_frontier = FrontierIndex(self._mask_or_empty(self.creep_mask))
+        return self._creep_frontier
+
+    @property
+    def no_creep_frontier(self) -> FrontierIndex:
+        """Closest pathable tile without creep lookups"""
+        if self._no_creep_frontier is None:
+            self._no_creep_frontier = FrontierIndex(
+                self._mask_or_empty(self.no_creep_mask)
+            )
+        return self._no_creep_frontier
+
+    @staticmethod
+    def _mask_or_empty(mask: Optional[np.ndarray]) -> np.ndarray:
+        return mask if mask is not None else np.zeros((1, 1), dtype=bool)
+
+    def update(self) -> None:
+        game_loop: int = self.bot.state.game_loop
+        if game_loop == self.game_loop:
+            return
+        self.game_loop = game_loop
+
+        if self.incremental:
+            self._update_incremental()
+            if self.changed_tile_count:
+                self._creep_frontier = self._no_creep_frontier = None
+            return
+
+        creep_grid: np.ndarray = self.bot.state.creep.data_numpy
+        pathable: np.ndarray = self.bot.game_info.pathing_grid.data_numpy == 1
+        self.creep_mask = creep_grid == 1
+        self.no_creep_mask = (creep_grid == 0) & pathable
+        self._creep_frontier = self._no_creep_frontier = None
+        creep: np.ndarray = np.where(self.creep_mask)
+        self.creep_map = np.vstack((creep[1], creep[0])).transpose()
+        no_creep: np.ndarray = np.where(self.no_creep_mask)
+        self.no_creep_map = np.vstack((no_creep[1], no_creep[0])).transpose()
+        self.pathable_tile_count = int(np.count_nonzero(pathable))
+        self.creep_tile_count = self.pathable_tile_count - no_creep[0].shape[0]
+
+    def _update_incremental(self) -> None:
+        creep_grid: np.ndarray = self.bot.state.creep.data_numpy
+        # python-sc2 replaces the pathing grid rather than changing it
+        pathing_grid: PixelMap = self.bot.game_info.pathing_grid
+        if pathing_grid is not self._pathing_grid:
+            self._pathing_grid = pathing_grid
+            self._pathable = pathing_grid.data_numpy == 1
+            self.pathable_tile_count = int(np.count_nonzero(self._pathable))
+
+        creep: np.ndarray = creep_grid == 1
+        no_creep: np.ndarray = (creep_grid == 0) & self._pathable
+        if self.creep_mask is None or self.creep_mask.shape != creep.shape:
+            self._creep_tiles = TileSet(creep.shape)
+            self._no_creep_tiles = TileSet(creep.shape)
+            self._creep_tiles.reset(creep)
+            self._no_creep_tiles.reset(no_creep)
+            self.changed_tile_count = int(creep.size)
+        else:
+            self.changed_tile_count = self._apply_diff(
+                self._creep_tiles, self.creep_mask, creep
+            ) + self._apply_diff(self._no_creep_tiles, self.no_creep_mask, no_creep)
+        self.creep_mask = creep
+        self.no_creep_mask = no_creep
+
+        self.creep_map = self._creep_tiles.tiles
+        self.no_creep_map = self._no_creep_tiles.tiles
+        self.creep_tile_count = self.pathable_tile_count - self._no_creep_tiles.amount
+
+    @staticmethod
+    def _apply_diff(tiles: TileSet, previous: np.ndarray, current: np.ndarray) -> int:
+        """Patch `tiles` with the tiles that differ between two masks, returns how many did"""
+        changed: np.ndarray = previous ^ current
+        if not changed.any():
+            return 0
+        tiles.remove(changed & previous)
+        tiles.add(changed & current)
+        return int(np.count_nonzero(changed))
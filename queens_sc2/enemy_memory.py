@@ -0,0 +1,83 @@
+from typing import List, Optional
+
+import numpy as np
+from sc2.bot_ai import BotAI
+from sc2.unit import Unit
+
+from queens_sc2.consts import GAME_LOOPS_PER_SECOND
+from queens_sc2.snapshot import UnitSnapshot, ground_attacker_indices
+
+
+class EnemyMemory:
+    """
+    Last seen position of every enemy unit, kept for `decay_seconds` after it was last seen
+    Stored as arrays in the same layout as `UnitSnapshot`, so `KDTrees` can index it
+    like any other frame snapshot. Units currently in vision are always included
+    Memories are dropped early if their last seen position is visible but the unit is gone
+    """
+
+    def __init__(self, bot: BotAI, decay_seconds: float) -> None:
+        self.bot: BotAI = bot
+        self.decay_loops: float = decay_seconds * GAME_LOOPS_PER_SECOND
+        self.snapshot: UnitSnapshot = UnitSnapshot(bot, [])
+        # game loop each remembered unit was last seen, lines up with `snapshot`
+        self.last_seen: np.ndarray = np.empty(0, dtype=np.int64)
+        self._ground_attacker_indices: Optional[np.ndarray] = None
+        # tags of destroyed units, removed on the next update
+        self._forget_tags: List[int] = []
+
+    @property
+    def amount(self) -> int:
+        return self.snapshot.amount
+
+    @property
+    def ground_attacker_indices(self) -> np.ndarray:
+        """Remembered units that can attack ground, see `ground_attacker_indices`"""
+        if self._ground_attacker_indices is None:
+            self._ground_attacker_indices = ground_attacker_indices(self.snapshot)
+        return self._ground_attacker_indices
+
+    def forget(self, unit_tag: int) -> None:
+        """Call when a unit is destroyed so it isn't remembered until it decays"""
+        self._forget_tags.append(unit_tag)
+
+    def update(self, visible: UnitSnapshot, game_loop: int) -> None:
+        """
+        Merge this frame's visible enemies into memory, and evict old memories
+        @param visible: the enemy snapshot for this frame
+        @param game_loop: current game loop
+        """
+        remembered: UnitSnapshot = self.snapshot
+        keep: np.ndarray = ~np.isin(remembered.tags, visible.tags)
+        keep &= game_loop - self.last_seen <= self.decay_loops
+        if self._forget_tags:
+            keep &= ~np.isin(
+                remembered.tags, np.array(self._forget_tags, dtype=np.uint64)
+            )
+            self._forget_tags = []
+        if keep.any():
+            keep &= ~self._visible_mask(remembered.positions)
+
+        kept: np.ndarray = np.flatnonzero(keep)
+        remembered_units: List[Unit] = remembered.units
+        self.snapshot = UnitSnapshot.from_arrays(
+            self.bot,
+            list(visible.units) + [remembered_units[index] for index in kept],
+            np.concatenate((visible.positions, remembered.positions[kept])),
+            np.concatenate((visible.tags, remembered.tags[kept])),
+            np.concatenate((visible.radii, remembered.radii[kept])),
+            np.concatenate((visible.is_flying, remembered.is_flying[kept])),
+        )
+        self.last_seen = np.concatenate(
+            (np.full(visible.amount, game_loop, dtype=np.int64), self.last_seen[kept])
+        )
+        self._ground_attacker_indices = None
+
+    def _visible_mask(self, positions: np.ndarray) -> np.ndarray:
+        """True where a position is currently in vision"""
+        visibility: np.ndarray = self.bot.state.visibility.data_numpy
+        height, width = visibility.shape
+        xs: np.ndarray = np.clip(positions[:, 0].astype(int), 0, width - 1)
+        ys: np.ndarray = np.clip(positions[:, 1].astype(int), 0, height - 1)
+        # 2 is visible, 1 is fogged and 0 is hidden
+        return visibility[ys, xs] == 2
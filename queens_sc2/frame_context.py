@@ -0,0 +1,190 @@
+from math import ceil, floor
+from typing import Optional
+
+import numpy as np
+from sc2.bot_ai import BotAI
+from sc2.position import Point2
+from sc2.units import Units
+
+from queens_sc2.cache import property_cache_once_per_frame
+from queens_sc2.consts import CHANGELING_TYPES_LUT, EXCLUDE_AIR_THREATS_LUT
+from queens_sc2.creep_grid import CreepGrid
+from queens_sc2.geometry import in_bounds
+from queens_sc2.kd_trees import BACKEND_KDTREE, KDTrees
+from queens_sc2.snapshot import EnemyFrame
+from queens_sc2.unit_registry import UnitRegistry
+
+# attribute on the bot object the context is stored under
+FRAME_CONTEXT_ATTRIBUTE: str = "_queens_frame_context"
+# tumors closer than this to an expansion location block it
+EXPANSION_BLOCKING_DISTANCE: float = 5.0
+
+
+class FrameContext:
+    """
+    Per frame state that doesn't depend on a `Queens` instance's policy
+    Stored on the bot, so bots running several `Queens` (ie: one for creep, one for defence)
+    only build the trees, creep grid and threat lists once per game loop
+    """
+
+    def __init__(
+        self,
+        bot: BotAI,
+        spatial_backend: str = BACKEND_KDTREE,
+        incremental_spatial_index: bool = False,
+        spatial_query_resolution: float = 0.0,
+        enemy_memory_seconds: float = 0.0,
+        raw_observation: bool = False,
+        incremental_creep_map: bool = False,
+    ) -> None:
+        self.bot: BotAI = bot
+        self.kd_trees: KDTrees = KDTrees(
+            bot,
+            backend=spatial_backend,
+            incremental=incremental_spatial_index,
+            query_resolution=spatial_query_resolution,
+            enemy_memory_seconds=enemy_memory_seconds,
+            raw_observation=raw_observation,
+        )
+        self.creep_grid: CreepGrid = CreepGrid(bot, incremental=incremental_creep_map)
+        self.unit_registry: UnitRegistry = UnitRegistry(bot)
+        self._expansion_blocking_mask: Optional[np.ndarray] = None
+
+    @classmethod
+    def for_bot(cls, bot: BotAI, **kwargs) -> "FrameContext":
+        """
+        The bot's frame context, created the first time it is asked for
+        Options in `kwargs` are only used when creating it, so the first `Queens` decides them
+        """
+        frame_context: Optional[FrameContext] = getattr(
+            bot, FRAME_CONTEXT_ATTRIBUTE, None
+        )
+        if frame_context is None:
+            frame_context = cls(bot, **kwargs)
+            setattr(bot, FRAME_CONTEXT_ATTRIBUTE, frame_context)
+        return frame_context
+
+    def update(self) -> None:
+        """Safe to call from every `Queens` each frame, only the first call does anything"""
+        self.kd_trees.update()
+
+    @property_cache_once_per_frame
+    def enemy_air_threats(self) -> Units:
+        """Every flying enemy unit, if any of them are within 18 of a ready townhall"""
+        self.update()
+        enemy: EnemyFrame = self.kd_trees.snapshot.enemy
+        air_units: np.ndarray = enemy.is_flying & ~enemy.is_structure
+        if not self._any_near_townhalls(
+            enemy.positions[air_units], self.unit_registry.ready_townhalls
+        ):
+            return Units([], self.bot)
+        return enemy.to_units(
+            np.flatnonzero(
+                air_units
+                & ~enemy.is_hallucination
+                & ~enemy.type_mask(EXCLUDE_AIR_THREATS_LUT)
+            )
+        )
+
+    @property_cache_once_per_frame
+    def enemy_ground_threats(self) -> Units:
+        """Every ground enemy, if any of them are within 18 of a townhall"""
+        self.update()
+        enemy: EnemyFrame = self.kd_trees.snapshot.enemy
+        ground_units: np.ndarray = ~enemy.is_flying
+        if not self._any_near_townhalls(
+            enemy.positions[ground_units], self.unit_registry.townhalls
+        ):
+            return Units([], self.bot)
+        return enemy.to_units(
+            np.flatnonzero(
+                ground_units
+                & ~enemy.is_hallucination
+                & ~enemy.is_burrowed
+                & ~enemy.type_mask(CHANGELING_TYPES_LUT)
+            )
+        )
+
+    @staticmethod
+    def _any_near_townhalls(
+        positions: np.ndarray, townhalls: Units, distance: float = 18.0
+    ) -> bool:
+        if positions.shape[0] == 0 or not townhalls:
+            return False
+        townhall_positions: np.ndarray = np.array(
+            [th.position_tuple for th in townhalls], dtype=float
+        )
+        offsets: np.ndarray = positions[None, :, :] - townhall_positions[:, None, :]
+        return bool(
+            (np.einsum("ijk,ijk->ij", offsets, offsets) < distance * distance).any()
+        )
+
+    @property
+    def expansion_blocking_mask(self) -> np.ndarray:
+        """
+        Mask on the half tile grid tumors are placed on, True at [2 * y, 2 * x]
+        if a tumor at (x, y) would block an expansion
+        Expansion locations don't change, so this is only worked out once
+        """
+        if self._expansion_blocking_mask is None:
+            height, width = self.bot.game_info.placement_grid.data_numpy.shape
+            mask: np.ndarray = np.zeros((2 * height + 1, 2 * width + 1), dtype=bool)
+            reach: float = EXPANSION_BLOCKING_DISTANCE
+            for expansion in self.bot.expansion_locations_list:
+                # only stamp the half tiles around each expansion
+                x_start: int = max(ceil((expansion[0] - reach) * 2), 0)
+                x_end: int = min(floor((expansion[0] + reach) * 2) + 1, mask.shape[1])
+                y_start: int = max(ceil((expansion[1] - reach) * 2), 0)
+                y_end: int = min(floor((expansion[1] + reach) * 2) + 1, mask.shape[0])
+                if x_start >= x_end or y_start >= y_end:
+                    continue
+                ys, xs = np.mgrid[y_start:y_end, x_start:x_end]
+                mask[y_start:y_end, x_start:x_end] |= (xs / 2 - expansion[0]) ** 2 + (
+                    ys / 2 - expansion[1]
+                ) ** 2 < reach * reach
+            mask.flags.writeable = False
+            self._expansion_blocking_mask = mask
+        return self._expansion_blocking_mask
+
+    def position_blocks_expansion(self, position: Point2) -> bool:
+        """Would a tumor at `position` (rounded to the nearest half tile) block an expansion"""
+        mask: np.ndarray = self.expansion_blocking_mask
+        height, width = mask.shape
+        x, y = round(position[0] * 2), round(position[1] * 2)
+        if 0 <= x < width and 0 <= y < height:
+            return bool(mask[y, x])
+        return bool(
+            self.positions_block_expansion(np.array([position], dtype=float))[0]
+        )
+
+    def positions_block_expansion(self, positions: np.ndarray) -> np.ndarray:
+        """
+        `position_blocks_expansion` for an (n, 2) array of positions
+        Positions off the map are checked against the expansion locations directly
+        """
+        mask: np.ndarray = self.expansion_blocking_mask
+        height, width = mask.shape
+        cells: np.ndarray = np.round(positions * 2).astype(int)
+        on_map: np.ndarray = in_bounds(cells, width, height)
+        blocks: np.ndarray = np.zeros(positions.shape[0], dtype=bool)
+        blocks[on_map] = mask[cells[on_map, 1], cells[on_map, 0]]
+        if not on_map.all():
+            expansions: np.ndarray = np.array(
+                self.bot.expansion_locations_list, dtype=float
+            ).reshape(-1, 2)
+            offsets: np.ndarray = (
+                cells[~on_map][:, None, :] / 2 - expansions[None, :, :]
+            )
+            blocks[~on_map] = (
+                np.einsum("ijk,ijk->ij", offsets, offsets)
+                < EXPANSION_BLOCKING_DISTANCE**2
+            ).any(axis=1)
+        return blocks
+
+    @property
+    def nydus_canals(self) -> Units:
+        return self.unit_registry.nydus_canals
+
+    @property
+    def nydus_networks(self) -> Units:
+        return self.unit_registry.nydus_networks
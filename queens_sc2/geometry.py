@@ -0,0 +1,85 @@
+from math import cos, hypot, pi, sin
+from random import uniform
+from typing import Tuple
+
+import numpy as np
+
+# Geometry on plain floats and numpy arrays, for hot loops that would otherwise create
+# lots of short lived `Point2` objects. Convert to `Point2` only when issuing a command
+# or calling something that needs one
+
+# offsets to the 8 surrounding tiles, same positions as `Point2.neighbors8`
+NEIGHBOR_8_OFFSETS: np.ndarray = np.array(
+    [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)],
+    dtype=float,
+)
+
+
+def points_towards(
+    x: float, y: float, target_x: float, target_y: float, distances: np.ndarray
+) -> np.ndarray:
+    """
+    Same as `Point2.towards` for each of `distances`, as an (n, 2) array
+    Each row is the position that distance from (x, y) in the direction of the target
+    """
+    distances = np.asarray(distances, dtype=float)
+    length: float = hypot(target_x - x, target_y - y)
+    if length == 0:
+        return np.tile((x, y), (distances.shape[0], 1)).astype(float)
+    direction: np.ndarray = np.array([(target_x - x) / length, (target_y - y) / length])
+    return np.array([x, y]) + distances[:, None] * direction
+
+
+def ring_points(x: float, y: float, distance: float, angles: np.ndarray) -> np.ndarray:
+    """Points `distance` from (x, y) at each of `angles` (radians), as an (n, 2) array"""
+    angles = np.asarray(angles, dtype=float)
+    return np.column_stack(
+        (x + distance * np.cos(angles), y + distance * np.sin(angles))
+    )
+
+
+def random_ring_points(x: float, y: float, distance: float, amount: int) -> np.ndarray:
+    """`amount` points at random angles `distance` from (x, y)"""
+    return ring_points(x, y, distance, np.random.uniform(0.0, 2 * pi, amount))
+
+
+def random_ring_point(x: float, y: float, distance: float) -> Tuple[float, float]:
+    """A point at a random angle `distance` from (x, y)"""
+    angle: float = uniform(0.0, 2 * pi)
+    return x + distance * cos(angle), y + distance * sin(angle)
+
+
+def neighbors8(x: float, y: float) -> np.ndarray:
+    """The 8 positions one tile away from (x, y), as an (8, 2) array"""
+    return NEIGHBOR_8_OFFSETS + (x, y)
+
+
+def tumor_grid_position(x: float, y: float) -> Tuple[float, float]:
+    """
+    Where a tumor ordered at (x, y) will end up
+    Tumors sit in the middle of a tile, so positions are rounded to the half tile grid
+    and moved onto the tile centre if they land on a tile edge
+    """
+    x = 0.5 * round(x / 0.5)
+    if int(x * 10) % 10 == 0:
+        x += 0.5
+    y = 0.5 * round(y / 0.5)
+    if int(y * 10) % 10 == 0:
+        y += 0.5
+    return x, y
+
+
+def squared_distances(points: np.ndarray, x: float, y: float) -> np.ndarray:
+    """Squared distance from each row of `points` to (x, y)"""
+    offsets: np.ndarray = points - (x, y)
+    return np.einsum("ij,ij->i", offsets, offsets)
+
+
+def in_bounds(points: np.ndarray, width: int, height: int) -> np.ndarray:
+    """True for each of `points` that is inside a `width` by `height` grid"""
+    return (
+        (points[:, 0] >= 0)
+        & (points[:, 0] < width)
+        & (points[:, 1] >= 0)
+        & (points[:, 1] < height)
+    )
@@ -1,70 +1,299 @@
-from typing import List, Optional, Union
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
+import numpy as np
 from sc2.bot_ai import BotAI
 from sc2.position import Point2
 from sc2.unit import Unit
 from sc2.units import Units
-from scipy.spatial import KDTree
+from scipy.spatial import KDTree, cKDTree
+
+from queens_sc2.enemy_memory import EnemyMemory
+from queens_sc2.snapshot import FrameSnapshot, UnitSnapshot
+from queens_sc2.spatial_hash import GridSpatialHash
+
+ENEMY_TREE: str = "enemy"
+ENEMY_GROUND_TREE: str = "enemy_ground"
+ENEMY_FLYING_TREE: str = "enemy_flying"
+OWN_TREE: str = "own"
+# category sub-indexes, so queries don't need filtering afterwards
+ENEMY_GROUND_ATTACKERS_TREE: str = "enemy_ground_attackers"
+ENEMY_TOWNHALLS_TREE: str = "enemy_townhalls"
+ENEMY_STATIC_DEFENCE_TREE: str = "enemy_static_defence"
+OWN_QUEENS_TREE: str = "own_queens"
+# last seen enemies, only differ from the current frame when `enemy_memory_seconds` is set
+ENEMY_MEMORY_TREE: str = "enemy_memory"
+ENEMY_MEMORY_GROUND_ATTACKERS_TREE: str = "enemy_memory_ground_attackers"
+
+# spatial index backends, all share the same query interface
+BACKEND_KDTREE: str = "kdtree"
+BACKEND_CKDTREE: str = "ckdtree"
+BACKEND_GRID: str = "grid"
+# pick grid or kdtree for each tree based on how many units are in it this frame,
+# each tree is built once per frame and serves both single point and batched queries
+BACKEND_AUTO: str = "auto"
+# with `BACKEND_AUTO`, trees with at most this many units use the grid
+AUTO_GRID_MAX_UNITS: int = 64
+
+SpatialIndex = Union[KDTree, cKDTree, GridSpatialHash]
+
+# memoized point query kinds, and which cached kinds can answer them
+POINT_QUERY_ANSWERED_BY: Dict[str, Tuple[str, ...]] = {
+    "any": ("any", "count", "indices"),
+    "count": ("count", "indices"),
+    "indices": ("indices",),
+}
 
 
 class KDTrees:
-    def __init__(self, bot: BotAI) -> None:
+    def __init__(
+        self,
+        bot: BotAI,
+        query_workers: int = 1,
+        backend: str = BACKEND_KDTREE,
+        incremental: bool = False,
+        incremental_tolerance: float = 1.0,
+        query_resolution: float = 0.0,
+        enemy_memory_seconds: float = 0.0,
+        raw_observation: bool = False,
+    ) -> None:
         self.bot: BotAI = bot
+        # passed to scipy for batched queries, -1 uses all available cores
+        # threads cost more than they save for the few dozen points queried each frame
+        self.query_workers: int = query_workers
+        if backend not in {BACKEND_KDTREE, BACKEND_CKDTREE, BACKEND_GRID, BACKEND_AUTO}:
+            raise ValueError(f"Unknown KDTrees backend: {backend}")
+        self.backend: str = backend
+        self.map_width, self.map_height = bot.game_info.map_size
         self.empty_units: Units = Units([], bot)
-        self.enemy_tree: Optional[KDTree] = None
-        self.own_tree: Optional[KDTree] = None
-        self.enemy_ground_tree: Optional[KDTree] = None
-        self.own_tree: Optional[KDTree] = None
-        self.enemy_flying_tree: Optional[KDTree] = None
+        # trees are only built the first time they are queried in a frame
+        # key: tree name, value: the units snapshot and an optional function
+        # returning indices into it (so categories are only worked out when queried)
+        self._tree_sources: Dict[
+            str, Tuple[UnitSnapshot, Optional[Callable[[], np.ndarray]]]
+        ] = {}
+        self._trees: Dict[str, Optional[SpatialIndex]] = {}
+        self.tree_builds: int = 0
+        self.tree_builds_skipped: int = 0
+        # positions of the units in each tree this frame, used for exact checks
+        self._tree_positions: Dict[str, np.ndarray] = {}
+
+        # incremental mode keeps trees across frames while units barely move
+        # queries on a reused tree are inflated by how far units moved, then checked exactly
+        self.incremental: bool = incremental
+        self.incremental_tolerance: float = incremental_tolerance
+        # key: tree name, value: (tree, unit tags, unit positions) at the time it was built
+        self._built_trees: Dict[str, Tuple[SpatialIndex, np.ndarray, np.ndarray]] = {}
+        # key: tree name, value: max distance any unit moved since the tree was built
+        self._tree_slack: Dict[str, float] = {}
+        self.tree_reuses: int = 0
+
+        # point queries are remembered for the rest of the frame
+        # with a resolution set, positions are snapped to that grid before querying,
+        # so nearby queries (ie: tumor candidates in the same tile) share one result
+        self.query_resolution: float = query_resolution
+        # key: (query kind, tree name, x, y, distance), value: query result
+        self._point_queries: Dict[
+            Tuple[str, str, float, float, float], Union[np.ndarray, int, bool]
+        ] = {}
+        self.point_query_hits: int = 0
+        self.point_query_misses: int = 0
+
+        # remember enemies that left vision, for `ENEMY_MEMORY_TREE` etc
+        self.enemy_memory: Optional[EnemyMemory] = (
+            EnemyMemory(bot, enemy_memory_seconds) if enemy_memory_seconds > 0 else None
+        )
+
+        # read enemy arrays straight from the raw observation, see `RawEnemyFrame`
+        self.raw_observation: bool = raw_observation
+        self.snapshot: Optional[FrameSnapshot] = None
+        self._enemy_flying: Optional[Units] = None
+        self._enemy_ground: Optional[Units] = None
+        # attack range results for this frame
+        # key: (unit tag, bonus distance), value: (flying indices, ground indices)
+        self._in_attack_range: Dict[
+            Tuple[int, float], Tuple[np.ndarray, np.ndarray]
+        ] = {}
 
-        self.enemy_flying: Units = self.empty_units
-        self.enemy_ground: Units = self.empty_units
+    @property
+    def enemy_tree(self) -> Optional[SpatialIndex]:
+        return self._get_tree(ENEMY_TREE)
+
+    @property
+    def enemy_ground_tree(self) -> Optional[SpatialIndex]:
+        return self._get_tree(ENEMY_GROUND_TREE)
+
+    @property
+    def enemy_flying_tree(self) -> Optional[SpatialIndex]:
+        return self._get_tree(ENEMY_FLYING_TREE)
+
+    @property
+    def own_tree(self) -> Optional[SpatialIndex]:
+        return self._get_tree(OWN_TREE)
+
+    @property
+    def enemy_flying(self) -> Units:
+        if self.snapshot is None:
+            return self.empty_units
+        if self._enemy_flying is None:
+            self._enemy_flying = self.snapshot.enemy.to_units(
+                self.snapshot.enemy_flying_indices
+            )
+        return self._enemy_flying
+
+    @property
+    def enemy_ground(self) -> Units:
+        if self.snapshot is None:
+            return self.empty_units
+        if self._enemy_ground is None:
+            self._enemy_ground = self.snapshot.enemy.to_units(
+                self.snapshot.enemy_ground_indices
+            )
+        return self._enemy_ground
 
     def update(self) -> None:
-        if all_enemy := self.bot.all_enemy_units:
-            self.enemy_tree = self._create_tree(all_enemy)
-            self.enemy_ground, self.enemy_flying = self._split_ground_fliers(all_enemy)
-            if len(self.enemy_ground) > 0:
-                self.enemy_ground_tree = self._create_tree(self.enemy_ground)
-            else:
-                self.enemy_ground_tree = None
-            if len(self.enemy_flying) > 0:
-                self.enemy_flying_tree = self._create_tree(self.enemy_flying)
-            else:
-                self.enemy_flying_tree = None
+        game_loop: int = self.bot.state.game_loop
+        if self.snapshot is not None and self.snapshot.game_loop == game_loop:
+            return
+
+        self.tree_builds_skipped += self._count_skipped_builds()
+
+        self.snapshot = FrameSnapshot(self.bot, self.raw_observation)
+        self._enemy_flying = None
+        self._enemy_ground = None
+        self._in_attack_range = {}
+        self._point_queries = {}
+        self._trees = {}
+        self._tree_positions = {}
+        self._tree_slack = {}
+        snapshot: FrameSnapshot = self.snapshot
+        self._tree_sources = {
+            ENEMY_TREE: (snapshot.enemy, None),
+            ENEMY_GROUND_TREE: (snapshot.enemy, lambda: snapshot.enemy_ground_indices),
+            ENEMY_FLYING_TREE: (snapshot.enemy, lambda: snapshot.enemy_flying_indices),
+            OWN_TREE: (snapshot.own, None),
+            ENEMY_GROUND_ATTACKERS_TREE: (
+                snapshot.enemy,
+                lambda: snapshot.enemy_ground_attacker_indices,
+            ),
+            ENEMY_TOWNHALLS_TREE: (
+                snapshot.enemy,
+                lambda: snapshot.enemy_townhall_indices,
+            ),
+            ENEMY_STATIC_DEFENCE_TREE: (
+                snapshot.enemy,
+                lambda: snapshot.enemy_static_defence_indices,
+            ),
+            OWN_QUEENS_TREE: (snapshot.own, lambda: snapshot.own_queen_indices),
+        }
+
+        enemy_memory: Optional[EnemyMemory] = self.enemy_memory
+        if enemy_memory is None:
+            self._tree_sources[ENEMY_MEMORY_TREE] = self._tree_sources[ENEMY_TREE]
+            self._tree_sources[ENEMY_MEMORY_GROUND_ATTACKERS_TREE] = self._tree_sources[
+                ENEMY_GROUND_ATTACKERS_TREE
+            ]
         else:
-            self.enemy_tree, self.enemy_ground_tree, self.enemy_flying_tree = (
-                None,
-                None,
-                None,
+            enemy_memory.update(snapshot.enemy, game_loop)
+            self._tree_sources[ENEMY_MEMORY_TREE] = (enemy_memory.snapshot, None)
+            self._tree_sources[ENEMY_MEMORY_GROUND_ATTACKERS_TREE] = (
+                enemy_memory.snapshot,
+                lambda: enemy_memory.ground_attacker_indices,
             )
 
-        self.own_tree = self._create_tree(self.bot.units)
+    def _count_skipped_builds(self) -> int:
+        """
+        Trees from the last frame that would have had units but were never queried
+        Aliases (ie: enemy memory trees when memory is off) share a source and count once
+        """
+        # key: id of the source, value: a tree name using it, or None if one was queried
+        unqueried: Dict[int, Optional[str]] = {}
+        for name, source in self._tree_sources.items():
+            if name in self._trees:
+                unqueried[id(source)] = None
+            else:
+                unqueried.setdefault(id(source), name)
 
-    @staticmethod
-    def _create_tree(units: Union[Units, List[Unit]]):
-        unit_position_list: List[List[float]] = [
-            [unit.position.x, unit.position.y] for unit in units
-        ]
-        if unit_position_list:
-            return KDTree(unit_position_list)
-        else:
+        skipped: int = 0
+        for name in unqueried.values():
+            if name is None or self._tree_sources[name][0].amount == 0:
+                continue
+            indices: Optional[np.ndarray] = self._tree_indices(name)
+            if indices is None or indices.shape[0] > 0:
+                skipped += 1
+        return skipped
+
+    def _get_tree(self, name: str) -> Optional[SpatialIndex]:
+        """Return the tree for this frame, building it on the first request"""
+        if name in self._trees:
+            return self._trees[name]
+        if name not in self._tree_sources:
             return None
 
-    def _split_ground_fliers(self, units: Units) -> List[Units]:
+        units: UnitSnapshot = self._tree_sources[name][0]
+        positions: np.ndarray = units.positions
+        indices: Optional[np.ndarray] = self._tree_indices(name)
+        if indices is not None:
+            positions = positions[indices]
+        self._tree_positions[name] = positions
+
+        tree: Optional[SpatialIndex] = None
+        if self.incremental:
+            tags: np.ndarray = units.tags if indices is None else units.tags[indices]
+            tree = self._reuse_tree(name, tags, positions)
+            if tree is None:
+                tree = self._create_tree(positions)
+                if tree is not None:
+                    self._built_trees[name] = (tree, tags, positions)
+        else:
+            tree = self._create_tree(positions)
+
+        if tree is not None and name not in self._tree_slack:
+            self.tree_builds += 1
+        self._trees[name] = tree
+        return tree
+
+    def _reuse_tree(
+        self, name: str, tags: np.ndarray, positions: np.ndarray
+    ) -> Optional[SpatialIndex]:
         """
-        Split units into ground units and flying units.
-        Returns ground units, then flying units.
-        @param units:
-        @return: ground units, flying units
+        Last built tree for `name`, if it holds exactly the same units
+        and none of them moved further than `incremental_tolerance`
         """
-        ground, fly = [], []
-        for unit in units:
-            if unit.is_flying:
-                fly.append(unit)
-            else:
-                ground.append(unit)
-        return [Units(ground, self.bot), Units(fly, self.bot)]
+        if name not in self._built_trees:
+            return None
+        tree, built_tags, built_positions = self._built_trees[name]
+        if not np.array_equal(tags, built_tags):
+            return None
+
+        offsets: np.ndarray = positions - built_positions
+        max_displacement: float = float(
+            np.sqrt(np.einsum("ij,ij->i", offsets, offsets).max())
+        )
+        if max_displacement > self.incremental_tolerance:
+            return None
+
+        self._tree_slack[name] = max_displacement
+        self.tree_reuses += 1
+        return tree
+
+    def _tree_indices(self, name: str) -> Optional[np.ndarray]:
+        """Indices into the tree's snapshot, `None` if the tree covers the whole snapshot"""
+        get_indices: Optional[Callable[[], np.ndarray]] = self._tree_sources[name][1]
+        return None if get_indices is None else get_indices()
+
+    def _create_tree(self, positions: np.ndarray) -> Optional[SpatialIndex]:
+        amount: int = positions.shape[0]
+        if amount == 0:
+            return None
+
+        backend: str = self.backend
+        if backend == BACKEND_AUTO:
+            backend = BACKEND_GRID if amount <= AUTO_GRID_MAX_UNITS else BACKEND_KDTREE
+        if backend == BACKEND_GRID:
+            return GridSpatialHash(positions, self.map_width, self.map_height)
+        if backend == BACKEND_CKDTREE:
+            return cKDTree(positions)
+        return KDTree(positions)
 
     def own_units_in_range_of_point(self, position: Point2, distance: float) -> Units:
         """
@@ -72,17 +301,7 @@ class KDTrees:
         @param position: the position or list of positions to get in range of
         @param distance: how far away to query
         """
-        if self.own_tree is None:
-            return self.empty_units
-
-        in_range_list: List[Units] = []
-        query_result = self.own_tree.query_ball_point([position], distance)
-        for result in query_result:
-            in_range_units = Units(
-                [self.bot.units[index] for index in result], self.bot
-            )
-            in_range_list.append(in_range_units)
-        return in_range_list[0]
+        return self.units_in_range_of_point(OWN_TREE, position, distance)
 
     def enemy_units_in_range(
         self, units: Union[Units, List[Unit]], distance: float
@@ -93,18 +312,20 @@ class KDTrees:
         @param units: list of units we want to get enemies in range of
         @param distance: how far away to query
         """
-        unit_positions: List[Point2] = [u.position for u in units]
-        if self.enemy_tree is None:
-            return [self.empty_units for _ in range(len(unit_positions))]
+        if self.snapshot is None:
+            return [self.empty_units for _ in range(len(units))]
 
         in_range_list: List[Units] = []
-        if unit_positions:
-            query_result = self.enemy_tree.query_ball_point(unit_positions, distance)
+        if units:
+            query_result: List[np.ndarray] = self._batch_query(
+                ENEMY_TREE,
+                np.array([u.position_tuple for u in units], dtype=float),
+                np.full(len(units), distance, dtype=float),
+                np.ones(len(units), dtype=bool),
+                include_enemy_radius=False,
+            )
             for result in query_result:
-                in_range_units = Units(
-                    [self.bot.all_enemy_units[index] for index in result], self.bot
-                )
-                in_range_list.append(in_range_units)
+                in_range_list.append(self.snapshot.enemy.to_units(result))
         return in_range_list
 
     def enemy_ground_in_range_of_point(
@@ -116,17 +337,7 @@ class KDTrees:
         @param position: the position or list of positions to get in range of
         @param distance: how far away to query
         """
-        if self.enemy_ground_tree is None or not self.enemy_ground:
-            return self.empty_units
-
-        in_range_list: List[Units] = []
-        query_result = self.enemy_ground_tree.query_ball_point([position], distance)
-        for result in query_result:
-            in_range_units = Units(
-                [self.enemy_ground[index] for index in result], self.bot
-            )
-            in_range_list.append(in_range_units)
-        return in_range_list[0]
+        return self.units_in_range_of_point(ENEMY_GROUND_TREE, position, distance)
 
     def enemy_flying_in_range_of_point(
         self, position: Point2, distance: float
@@ -137,17 +348,7 @@ class KDTrees:
         @param position: the position or list of positions to get in range of
         @param distance: how far away to query
         """
-        if self.enemy_flying_tree is None or not self.enemy_flying:
-            return self.empty_units
-
-        in_range_list: List[Units] = []
-        query_result = self.enemy_flying_tree.query_ball_point([position], distance)
-        for result in query_result:
-            in_range_units = Units(
-                [self.enemy_flying[index] for index in result], self.bot
-            )
-            in_range_list.append(in_range_units)
-        return in_range_list[0]
+        return self.units_in_range_of_point(ENEMY_FLYING_TREE, position, distance)
 
     def enemy_units_in_range_of_point(self, position: Point2, distance: float) -> Units:
         """
@@ -156,55 +357,390 @@ class KDTrees:
         @param position: the position or list of positions to get in range of
         @param distance: how far away to query
         """
-        if self.enemy_tree is None or not self.bot.all_enemy_units:
-            return self.empty_units
+        return self.units_in_range_of_point(ENEMY_TREE, position, distance)
 
-        in_range_list: List[Units] = []
-        query_result = self.enemy_tree.query_ball_point([position], distance)
-        for result in query_result:
-            in_range_units = Units(
-                [self.bot.all_enemy_units[index] for index in result], self.bot
+    def indices_in_range_of_point(
+        self, tree_name: str, position: Point2, distance: float
+    ) -> np.ndarray:
+        """
+        Low level query that skips `Units` construction
+        @param tree_name: one of the tree name constants in this module, ie: `ENEMY_GROUND_TREE`
+        @param position: the position to get in range of
+        @param distance: how far away to query
+        @return: indices into `snapshot.own` for own trees, `enemy_memory.snapshot` for
+            enemy memory trees (if enabled), else into `snapshot.enemy`
+        """
+        tree: Optional[SpatialIndex] = self._get_tree(tree_name)
+        if tree is None:
+            return np.empty(0, dtype=int)
+
+        x, y = self._snap_position(position)
+        cached: Optional[np.ndarray] = self._cached_point_query(
+            "indices", tree_name, x, y, distance
+        )
+        if cached is not None:
+            return cached
+
+        query_result: np.ndarray = self._query_ball_point(
+            tree_name, tree, (x, y), distance
+        )
+        indices: Optional[np.ndarray] = self._tree_indices(tree_name)
+        if indices is not None:
+            query_result = indices[query_result]
+        # shared by every caller this frame
+        query_result.flags.writeable = False
+        self._point_queries[("indices", tree_name, x, y, distance)] = query_result
+        return query_result
+
+    def count_in_range_of_point(
+        self, tree_name: str, position: Point2, distance: float
+    ) -> int:
+        """How many units of `tree_name` are within distance of the position"""
+        tree: Optional[SpatialIndex] = self._get_tree(tree_name)
+        if tree is None:
+            return 0
+
+        x, y = self._snap_position(position)
+        cached: Optional[Union[np.ndarray, int]] = self._cached_point_query(
+            "count", tree_name, x, y, distance
+        )
+        if cached is not None:
+            return cached if isinstance(cached, int) else cached.shape[0]
+
+        if self._tree_slack.get(tree_name, 0.0) > 0.0:
+            count: int = self._query_ball_point(
+                tree_name, tree, (x, y), distance
+            ).shape[0]
+        else:
+            count: int = int(
+                tree.query_ball_point((x, y), distance, return_length=True)
             )
-            in_range_list.append(in_range_units)
-        return in_range_list[0]
+        self._point_queries[("count", tree_name, x, y, distance)] = count
+        return count
 
-    def get_enemies_in_attack_range_of(
-        self, unit: Unit, bonus_distance: int = 0.375
-    ) -> Units:
-        """Get all enemies in attack range of unit.
-        WARNING: Won't be as accurate as `units.in_attack_range_of` since can't take into account enemy radius
-        Bonus_distance has default of 0.375 (radius of a zergling)
-        But this is way faster
-        """
-        if unit.air_range == unit.ground_range:
-            return self.enemy_units_in_range(
-                [unit], unit.air_range + unit.radius + bonus_distance
-            )[unit.tag]
-        if unit.can_attack_air:
-            in_air_range = self.enemy_flying_in_range_of_point(
-                unit.position, unit.air_range + unit.radius + bonus_distance
+    def any_in_range_of_point(
+        self, tree_name: str, position: Point2, distance: float
+    ) -> bool:
+        """
+        Is there at least one unit of `tree_name` within distance of the position
+        The grid does a nearest neighbour query with an upper bound, so it can stop early.
+        scipy is quicker counting the ball query than running `query` with an upper bound
+        """
+        tree: Optional[SpatialIndex] = self._get_tree(tree_name)
+        if tree is None:
+            return False
+
+        x, y = self._snap_position(position)
+        cached: Optional[Union[np.ndarray, int, bool]] = self._cached_point_query(
+            "any", tree_name, x, y, distance
+        )
+        if cached is not None:
+            if isinstance(cached, np.ndarray):
+                return cached.shape[0] > 0
+            return cached > 0
+
+        if self._tree_slack.get(tree_name, 0.0) > 0.0:
+            found: bool = (
+                self._query_ball_point(tree_name, tree, (x, y), distance).shape[0] > 0
+            )
+        elif isinstance(tree, GridSpatialHash):
+            # upper bound is exclusive, nudge it so this matches `query_ball_point`
+            nearest_distance, _ = tree.query(
+                (x, y), distance_upper_bound=np.nextafter(distance, np.inf)
             )
+            found: bool = bool(nearest_distance != np.inf)
         else:
-            in_air_range = self.empty_units
+            found: bool = (
+                tree.query_ball_point((x, y), distance, return_length=True) > 0
+            )
+        self._point_queries[("any", tree_name, x, y, distance)] = found
+        return found
 
-        if unit.can_attack_ground:
-            in_ground_range = self.enemy_ground_in_range_of_point(
-                unit.position, unit.ground_range + unit.radius + bonus_distance
+    def any_in_range_of_points(
+        self, tree_name: str, positions: np.ndarray, distance: float
+    ) -> np.ndarray:
+        """
+        `any_in_range_of_point` for many positions in one query, ie: tumor placement candidates
+        Positions are queried exactly (not snapped to `query_resolution`) and not remembered
+        @param tree_name: one of the tree name constants in this module
+        @param positions: (n, 2) array of positions
+        @param distance: how far away to query
+        @return: boolean array, True where a unit is within distance of the position
+        """
+        found: np.ndarray = np.zeros(positions.shape[0], dtype=bool)
+        tree: Optional[SpatialIndex] = self._get_tree(tree_name)
+        if tree is None or positions.shape[0] == 0:
+            return found
+
+        slack: float = self._tree_slack.get(tree_name, 0.0)
+        if slack == 0.0:
+            counts: np.ndarray = np.asarray(
+                tree.query_ball_point(
+                    positions, distance, workers=self.query_workers, return_length=True
+                )
             )
-        else:
-            in_ground_range = self.empty_units
-        return in_air_range + in_ground_range
+            return counts > 0
+
+        tree_positions: np.ndarray = self._tree_positions[tree_name]
+        query_result = tree.query_ball_point(
+            positions, distance + slack, workers=self.query_workers
+        )
+        for i, result in enumerate(query_result):
+            if not result:
+                continue
+            offsets: np.ndarray = tree_positions[result] - positions[i]
+            found[i] = bool(
+                (np.einsum("ij,ij->i", offsets, offsets) <= distance * distance).any()
+            )
+        return found
+
+    def _snap_position(self, position: Point2) -> Tuple[float, float]:
+        """Position actually queried, snapped to `query_resolution` if one is set"""
+        resolution: float = self.query_resolution
+        if resolution <= 0.0:
+            return float(position[0]), float(position[1])
+        return (
+            round(position[0] / resolution) * resolution,
+            round(position[1] / resolution) * resolution,
+        )
+
+    def _cached_point_query(
+        self, kind: str, tree_name: str, x: float, y: float, distance: float
+    ) -> Optional[Union[np.ndarray, int, bool]]:
+        """
+        Earlier result this frame that answers a `kind` query, updating hit / miss stats
+        Counts and indices can also answer an "any" query, indices can answer a "count" query
+        """
+        kinds: Tuple[str, ...] = POINT_QUERY_ANSWERED_BY[kind]
+        for cached_kind in kinds:
+            key: Tuple[str, str, float, float, float] = (
+                cached_kind,
+                tree_name,
+                x,
+                y,
+                distance,
+            )
+            if key in self._point_queries:
+                self.point_query_hits += 1
+                return self._point_queries[key]
+        self.point_query_misses += 1
+        return None
+
+    def _query_ball_point(
+        self,
+        tree_name: str,
+        tree: SpatialIndex,
+        position: Point2,
+        distance: float,
+    ) -> np.ndarray:
+        """
+        Indices into the tree of units within distance of the position
+        If the tree was reused from an earlier frame, the query is inflated by how far
+        units have moved since and then checked against this frame's positions
+        """
+        slack: float = self._tree_slack.get(tree_name, 0.0)
+        query_result: np.ndarray = np.asarray(
+            tree.query_ball_point(position, distance + slack), dtype=int
+        )
+        if slack > 0.0 and query_result.shape[0] > 0:
+            offsets: np.ndarray = self._tree_positions[tree_name][
+                query_result
+            ] - np.asarray(position, dtype=float)
+            query_result = query_result[
+                np.einsum("ij,ij->i", offsets, offsets) <= distance * distance
+            ]
+        return query_result
+
+    def units_in_range_of_point(
+        self, tree_name: str, position: Point2, distance: float
+    ) -> Units:
+        """
+        Get units from any tree in range of the position, ie: `ENEMY_STATIC_DEFENCE_TREE`
+        @param tree_name: one of the tree name constants in this module
+        @param position: the position to get in range of
+        @param distance: how far away to query
+        """
+        if self.snapshot is None:
+            return self.empty_units
+        return self._tree_sources[tree_name][0].to_units(
+            self.indices_in_range_of_point(tree_name, position, distance)
+        )
+
+    def get_enemies_in_attack_range_of(
+        self, unit: Unit, bonus_distance: float = 0.0
+    ) -> Units:
+        """
+        Get all enemies in attack range of unit.
+        Matches `units.in_attack_range_of`, enemy radius is taken into account per unit
+        @param unit: the attacking unit
+        @param bonus_distance: extra range on top of the unit's weapon range
+        """
+        if self.snapshot is None:
+            return self.empty_units
+        return self.snapshot.enemy.to_units(
+            self.enemy_indices_in_attack_range_of(unit, bonus_distance)
+        )
 
     def get_ground_in_attack_range_of(
-        self, unit: Unit, bonus_distance: int = 0.375
+        self, unit: Unit, bonus_distance: float = 0.0
     ) -> Units:
-        return self.enemy_ground_in_range_of_point(
-            unit.position, unit.air_range + unit.radius + bonus_distance
+        if self.snapshot is None:
+            return self.empty_units
+        return self.snapshot.enemy.to_units(
+            self._attack_range_indices(unit, bonus_distance)[1]
         )
 
     def get_flying_in_attack_range_of(
-        self, unit: Unit, bonus_distance: int = 0.375
+        self, unit: Unit, bonus_distance: float = 0.0
     ) -> Units:
-        return self.enemy_flying_in_range_of_point(
-            unit.position, unit.air_range + unit.radius + bonus_distance
+        if self.snapshot is None:
+            return self.empty_units
+        return self.snapshot.enemy.to_units(
+            self._attack_range_indices(unit, bonus_distance)[0]
+        )
+
+    def enemy_indices_in_attack_range_of(
+        self, unit: Unit, bonus_distance: float = 0.0
+    ) -> np.ndarray:
+        """
+        Same as `get_enemies_in_attack_range_of`, but indices into `snapshot.enemy`
+        so callers can work on the enemy arrays without building `Units`
+        """
+        if self.snapshot is None:
+            return np.empty(0, dtype=int)
+        return np.concatenate(self._attack_range_indices(unit, bonus_distance))
+
+    def any_enemy_in_attack_range_of(
+        self, unit: Unit, bonus_distance: float = 0.0
+    ) -> bool:
+        return self.enemy_indices_in_attack_range_of(unit, bonus_distance).shape[0] > 0
+
+    def get_enemies_in_attack_range_of_units(
+        self, units: Union[Units, List[Unit]], bonus_distance: float = 0.0
+    ) -> Dict[int, Units]:
+        """
+        Batched version of `get_enemies_in_attack_range_of`
+        Every unit is queried against the flying and ground trees in a single call each,
+        using a per unit radius. Results are kept for the rest of the frame so
+        `get_enemies_in_attack_range_of` can return them without touching the trees again
+        @param units: units we want to get enemies in attack range of, ie: all managed queens
+        @param bonus_distance: extra range on top of each unit's weapon range
+        @return: key: unit tag, value: enemies in range of that unit
+        """
+        self.query_attack_ranges(units, bonus_distance)
+        return {
+            unit.tag: self.get_enemies_in_attack_range_of(unit, bonus_distance)
+            for unit in units
+        }
+
+    def _attack_range_indices(
+        self, unit: Unit, bonus_distance: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Flying and ground enemy indices in attack range of unit, queried if not done yet this frame"""
+        key: Tuple[int, float] = (unit.tag, bonus_distance)
+        if key not in self._in_attack_range:
+            self.query_attack_ranges([unit], bonus_distance)
+        return self._in_attack_range[key]
+
+    def query_attack_ranges(
+        self, units: Union[Units, List[Unit]], bonus_distance: float = 0.0
+    ) -> None:
+        """
+        Work out which enemies are in attack range of each unit and store it for this frame
+        Call with every unit up front to batch the queries, then read results with
+        `enemy_indices_in_attack_range_of` or `get_enemies_in_attack_range_of`
+        Trees are queried with the largest enemy radius added on, then results are trimmed
+        to the exact per enemy radius
+        """
+        amount: int = len(units)
+        if amount == 0:
+            return
+
+        positions: np.ndarray = np.array([unit.position_tuple for unit in units])
+        radii: np.ndarray = np.fromiter(
+            (unit.radius + bonus_distance for unit in units), dtype=float, count=amount
+        )
+        air_ranges: np.ndarray = np.fromiter(
+            (unit.air_range if unit.can_attack_air else -1.0 for unit in units),
+            dtype=float,
+            count=amount,
+        )
+        ground_ranges: np.ndarray = np.fromiter(
+            (unit.ground_range if unit.can_attack_ground else -1.0 for unit in units),
+            dtype=float,
+            count=amount,
+        )
+
+        in_air_range: List[np.ndarray] = self._batch_query(
+            ENEMY_FLYING_TREE,
+            positions,
+            air_ranges + radii,
+            air_ranges >= 0.0,
+        )
+        in_ground_range: List[np.ndarray] = self._batch_query(
+            ENEMY_GROUND_TREE,
+            positions,
+            ground_ranges + radii,
+            ground_ranges >= 0.0,
+        )
+
+        for i, unit in enumerate(units):
+            self._in_attack_range[(unit.tag, bonus_distance)] = (
+                in_air_range[i],
+                in_ground_range[i],
+            )
+
+    def _batch_query(
+        self,
+        tree_name: str,
+        positions: np.ndarray,
+        distances: np.ndarray,
+        mask: np.ndarray,
+        include_enemy_radius: bool = True,
+    ) -> List[np.ndarray]:
+        """
+        Query many positions against one enemy tree, each with its own radius
+        With `include_enemy_radius` the enemy's own radius counts towards the distance,
+        same as `Unit.target_in_range`
+        Candidates are always checked against this frame's positions, so reused trees are exact
+        Positions where `mask` is False are skipped and get an empty result
+        @return: for each position, indices into the enemy snapshot
+        """
+        results: List[np.ndarray] = [
+            np.empty(0, dtype=int) for _ in range(positions.shape[0])
+        ]
+        tree: Optional[SpatialIndex] = self._get_tree(tree_name)
+        if tree is None or not mask.any():
+            return results
+
+        enemy: UnitSnapshot = self._tree_sources[tree_name][0]
+        tree_indices: Optional[np.ndarray] = self._tree_indices(tree_name)
+        if tree_indices is None:
+            tree_indices = np.arange(enemy.amount)
+        if include_enemy_radius:
+            enemy_radii: np.ndarray = enemy.radii[tree_indices]
+        else:
+            enemy_radii: np.ndarray = np.zeros(tree_indices.shape[0])
+        query_positions: np.ndarray = np.flatnonzero(mask)
+        query_result = tree.query_ball_point(
+            positions[query_positions],
+            distances[query_positions]
+            + enemy_radii.max()
+            + self._tree_slack.get(tree_name, 0.0),
+            workers=self.query_workers,
         )
+        for position_index, result in zip(query_positions, query_result):
+            if not result:
+                continue
+            candidates: np.ndarray = np.asarray(result, dtype=int)
+            offsets: np.ndarray = (
+                enemy.positions[tree_indices[candidates]] - positions[position_index]
+            )
+            max_distances: np.ndarray = (
+                distances[position_index] + enemy_radii[candidates]
+            )
+            in_range: np.ndarray = np.einsum("ij,ij->i", offsets, offsets) <= (
+                max_distances * max_distances
+            )
+            results[position_index] = tree_indices[candidates[in_range]]
+        return results
@@ -1,51 +1,37 @@
 import math
 from abc import ABC, abstractmethod
-from math import cos, sin
-from random import randint
-from typing import List, Optional, Set
+from typing import List, Optional, Set, Tuple
 
 import numpy as np
 from scipy import spatial
 
-from queens_sc2.cache import property_cache_once_per_frame
+from queens_sc2.cache import method_cache_once_per_frame
 from queens_sc2.consts import (
-    ALL_STRUCTURES,
-    CHANGELING_TYPES,
-    GROUND_TOWNHALL_TYPES,
+    ALL_STRUCTURES_LUT,
+    EXCLUDE_FROM_ATTACK_TARGETS_AND_STATIC_DEFENCE_LUT,
+    EXCLUDE_FROM_ATTACK_TARGETS_LUT,
     QUEEN_TURN_RATE,
 )
-from queens_sc2.kd_trees import KDTrees
+from queens_sc2.creep_grid import FrontierIndex
+from queens_sc2.frame_context import FrameContext
+from queens_sc2.geometry import random_ring_point, squared_distances
+from queens_sc2.kd_trees import (
+    ENEMY_MEMORY_GROUND_ATTACKERS_TREE,
+    ENEMY_TOWNHALLS_TREE,
+    OWN_QUEENS_TREE,
+    KDTrees,
+)
 from queens_sc2.policy import Policy
+from queens_sc2.snapshot import EnemyFrame, FrameSnapshot
 from sc2.bot_ai import BotAI
 from sc2.ids.buff_id import BuffId
 from sc2.ids.unit_typeid import UnitTypeId as UnitID
-from sc2.position import Point2, Pointlike
+from sc2.position import Point2
 from sc2.unit import Unit
 from sc2.units import Units
 
-EXCLUDE_AIR_THREATS: Set[UnitID] = {UnitID.OVERLORD, UnitID.OVERSEER, UnitID.OBSERVER}
-EXCLUDE_FROM_ATTACK_TARGETS: Set[UnitID] = {UnitID.MULE, UnitID.EGG, UnitID.LARVA}
-EXCLUDE_FROM_POS_NEAR_ENEMY: Set[UnitID] = {
-    UnitID.DRONE,
-    UnitID.SCV,
-    UnitID.PROBE,
-    UnitID.CHANGELING,
-    UnitID.CHANGELINGMARINE,
-    UnitID.CHANGELINGZERGLING,
-    UnitID.CHANGELINGZERGLINGWINGS,
-    UnitID.CHANGELINGZEALOT,
-    UnitID.CHANGELINGMARINESHIELD,
-    UnitID.OVERLORD,
-    UnitID.OVERSEER,
-    UnitID.OBSERVER,
-}
-STATIC_DEFENCE: Set[UnitID] = {
-    UnitID.BUNKER,
-    UnitID.PHOTONCANNON,
-    UnitID.PLANETARYFORTRESS,
-    UnitID.SHIELDBATTERY,
-    UnitID.SPINECRAWLER,
-}
+# tree ball queries include the radius, this keeps townhalls exactly 20 away out
+ENEMY_TOWNHALL_DISTANCE: float = float(np.nextafter(20.0, 0.0))
 
 
 class BaseUnit(ABC):
@@ -56,43 +42,13 @@ class BaseUnit(ABC):
         self.kd_trees: KDTrees = kd_trees
         self.map_data: Optional["MapData"] = map_data
 
-    @property_cache_once_per_frame
+    @property
     def enemy_air_threats(self) -> Units:
-        air_threats: Units = Units([], self.bot)
-        air_units: Units = self.bot.enemy_units.flying
-        threats: Units = Units([], self.bot)
-        if air_units:
-            for th in self.bot.townhalls.ready:
-                closest_enemy: Unit = air_units.closest_to(th)
-                if closest_enemy.position.distance_to(th) < 18.0:
-                    air_threats.extend(
-                        self.bot.enemy_units.filter(
-                            lambda unit: unit.is_flying
-                            and not unit.is_hallucination
-                            and unit.type_id not in EXCLUDE_AIR_THREATS
-                        )
-                    )
-            threats = air_threats
-        return threats
+        return FrameContext.for_bot(self.bot).enemy_air_threats
 
-    @property_cache_once_per_frame
+    @property
     def enemy_ground_threats(self) -> Units:
-        ground_threats: Units = Units([], self.bot)
-        ground_units: Units = self.bot.all_enemy_units.not_flying
-        threats: Units = Units([], self.bot)
-        if ground_units:
-            for th in self.bot.townhalls:
-                closest_enemy: Unit = ground_units.closest_to(th)
-                if closest_enemy.position.distance_to(th) < 18:
-                    ground_threats.extend(
-                        ground_units.filter(
-                            lambda unit: not unit.is_hallucination
-                            and not unit.is_burrowed
-                            and unit.type_id not in CHANGELING_TYPES
-                        )
-                    )
-            threats = ground_threats
-        return threats
+        return FrameContext.for_bot(self.bot).enemy_ground_threats
 
     @abstractmethod
     def handle_unit(
@@ -196,36 +152,42 @@ class BaseUnit(ABC):
         if not queen:
             return
         if attack_static_defence:
-            excluded_enemy: Set[UnitID] = EXCLUDE_FROM_ATTACK_TARGETS
+            excluded_enemy: np.ndarray = EXCLUDE_FROM_ATTACK_TARGETS_LUT
         else:
-            excluded_enemy: Set[UnitID] = EXCLUDE_FROM_ATTACK_TARGETS.union(
-                STATIC_DEFENCE
+            excluded_enemy: np.ndarray = (
+                EXCLUDE_FROM_ATTACK_TARGETS_AND_STATIC_DEFENCE_LUT
             )
-        _enemy: Units = enemy.filter(
-            lambda u: u.type_id not in excluded_enemy
-            and (not u.is_cloaked or u.is_cloaked and u.is_revealed)
-            and (not u.is_burrowed or u.is_burrowed and u.is_visible)
-            and not u.is_structure
+        closest_enemy: Optional[Unit] = self._closest_attack_target(
+            queen, enemy, excluded_enemy
         )
-        in_range_enemies: Units = self.kd_trees.get_enemies_in_attack_range_of(queen)
-        in_range_no_structures: Units = in_range_enemies.filter(
-            lambda u: u.type_id not in ALL_STRUCTURES
+        enemy_frame: Optional[EnemyFrame] = (
+            self.kd_trees.snapshot.enemy if self.kd_trees.snapshot else None
+        )
+        in_range_enemies: np.ndarray = self.kd_trees.enemy_indices_in_attack_range_of(
+            queen
         )
         target: Optional[Unit] = None
-        if _enemy and not queen.is_attacking:
-            if in_range_no_structures:
-                target: Unit = self.get_target_from_in_range_enemies(in_range_enemies)
+        if closest_enemy and not queen.is_attacking:
+            if (
+                in_range_enemies.shape[0] > 0
+                and (~enemy_frame.type_mask(ALL_STRUCTURES_LUT)[in_range_enemies]).any()
+            ):
+                target: Unit = enemy_frame.units[
+                    enemy_frame.lowest_health_index(in_range_enemies)
+                ]
             if target:
                 self.handle_target(queen, target, grid)
             else:
-                queen.move(_enemy.closest_to(queen).position)
+                queen.move(closest_enemy.position)
 
-        elif in_range_enemies:
-            target: Unit = self.get_target_from_in_range_enemies(in_range_enemies)
+        elif in_range_enemies.shape[0] > 0:
+            target: Unit = enemy_frame.units[
+                enemy_frame.lowest_health_index(in_range_enemies)
+            ]
             if target:
                 self.handle_target(queen, target, grid)
             else:
-                queen.attack(in_range_enemies.center)
+                queen.attack(enemy_frame.center(in_range_enemies))
         else:
             # if we get here, it's because we can't see the enemy, try to move to the nearest spore if possible
             if enemy and self.map_data and grid is not None:
@@ -255,6 +217,36 @@ class BaseUnit(ABC):
                 if self.bot.in_pathing_grid(move_to):
                     queen.move(move_to)
 
+    def _closest_attack_target(
+        self, queen: Unit, enemy: Units, excluded_enemy: np.ndarray
+    ) -> Optional[Unit]:
+        """
+        Closest enemy the queen may chase down, see `EnemyFrame.attack_target_mask`
+        @param excluded_enemy: lookup table of types to leave out, from `consts`
+        Filters on this frame's enemy arrays, unless `enemy` holds units that aren't in them
+        """
+        if not enemy:
+            return None
+        snapshot: Optional[FrameSnapshot] = self.kd_trees.snapshot
+        indices: np.ndarray = (
+            snapshot.enemy.indices_of(enemy) if snapshot else np.empty(0, dtype=int)
+        )
+        if snapshot is None or (indices < 0).any():
+            valid_enemy: Units = enemy.filter(
+                lambda u: not excluded_enemy[u.type_id.value]
+                and (not u.is_cloaked or u.is_cloaked and u.is_revealed)
+                and (not u.is_burrowed or u.is_burrowed and u.is_visible)
+                and not u.is_structure
+            )
+            return valid_enemy.closest_to(queen) if valid_enemy else None
+
+        enemy_frame: EnemyFrame = snapshot.enemy
+        indices = indices[enemy_frame.attack_target_mask(excluded_enemy)[indices]]
+        closest_index: Optional[int] = enemy_frame.closest_index(
+            indices, queen.position_tuple
+        )
+        return None if closest_index is None else enemy_frame.units[closest_index]
+
     def handle_target(
         self, queen: Unit, target: Unit, grid: Optional[np.ndarray] = None
     ) -> None:
@@ -276,16 +268,15 @@ class BaseUnit(ABC):
         attack_target: Point2 = (
             offensive_pos if offensive_pos else self.bot.enemy_start_locations[0]
         )
-        own_close_queens: Units = self.kd_trees.own_units_in_range_of_point(
-            queen.position, 5
-        ).filter(lambda u: u.type_id == UnitID.QUEEN)
-        if in_attack_range := self.kd_trees.get_enemies_in_attack_range_of(queen):
-            target: Unit = self.get_target_from_in_range_enemies(in_attack_range)
+        own_close_queens: int = self.kd_trees.count_in_range_of_point(
+            OWN_QUEENS_TREE, queen.position, 5
+        )
+        if target := self.get_target_in_attack_range_of(queen):
             if self.attack_ready(queen, target):
                 queen.attack(target)
             else:
                 # loose queen_control should try to rejoin the queen pack
-                if own_close_queens.amount <= 3:
+                if own_close_queens <= 3:
                     queen.move(queens.center)
                 # otherwise move forward between attacks, since Queen is slow and can get stuck behind each other
                 else:
@@ -293,6 +284,19 @@ class BaseUnit(ABC):
         else:
             queen.attack(attack_target)
 
+    def get_target_in_attack_range_of(self, queen: Unit) -> Optional[Unit]:
+        """
+        Same choice as `get_target_from_in_range_enemies`, made on this frame's enemy arrays
+        `None` if nothing is in range
+        """
+        in_attack_range: np.ndarray = self.kd_trees.enemy_indices_in_attack_range_of(
+            queen
+        )
+        if in_attack_range.shape[0] == 0:
+            return None
+        enemy_frame: EnemyFrame = self.kd_trees.snapshot.enemy
+        return enemy_frame.units[enemy_frame.lowest_health_index(in_attack_range)]
+
     @staticmethod
     def get_target_from_in_range_enemies(in_range_enemies: Units) -> Unit:
         """We get the queen_control to prioritise in range flying units"""
@@ -316,24 +320,33 @@ class BaseUnit(ABC):
         """Returns turn speed of unit in radians"""
         return QUEEN_TURN_RATE * 1.4 * math.pi / 180
 
+    @method_cache_once_per_frame(resolution=0.5)
     def position_near_enemy(self, pos: Point2) -> bool:
-        return (
-            self.kd_trees.enemy_units_in_range_of_point(pos, 10.0)
-            .filter(
-                lambda unit: unit.can_attack_ground
-                and unit.type_id not in EXCLUDE_FROM_POS_NEAR_ENEMY
-                and unit.type_id not in ALL_STRUCTURES
-            )
-            .amount
-            > 0
+        # includes recently seen enemies that left vision, if `KDTrees` remembers them
+        return self.kd_trees.any_in_range_of_point(
+            ENEMY_MEMORY_GROUND_ATTACKERS_TREE, pos, 10.0
         )
 
+    @method_cache_once_per_frame(resolution=0.5)
     def position_near_enemy_townhall(self, pos: Point2) -> bool:
-        close_townhalls: Units = self.bot.enemy_structures.filter(
-            lambda unit: unit.type_id in GROUND_TOWNHALL_TYPES
-            and unit.distance_to(pos) < 20
+        return self.kd_trees.any_in_range_of_point(
+            ENEMY_TOWNHALLS_TREE, pos, ENEMY_TOWNHALL_DISTANCE
+        )
+
+    def positions_near_enemy(self, positions: np.ndarray) -> np.ndarray:
+        """
+        `position_near_enemy` for an (n, 2) array of positions
+        Positions are snapped to half tiles first, same as the cached single position check
+        """
+        return self.kd_trees.any_in_range_of_points(
+            ENEMY_MEMORY_GROUND_ATTACKERS_TREE, np.round(positions * 2) / 2, 10.0
+        )
+
+    def positions_near_enemy_townhall(self, positions: np.ndarray) -> np.ndarray:
+        """`position_near_enemy_townhall` for an (n, 2) array of positions, snapped to half tiles"""
+        return self.kd_trees.any_in_range_of_points(
+            ENEMY_TOWNHALLS_TREE, np.round(positions * 2) / 2, ENEMY_TOWNHALL_DISTANCE
         )
-        return close_townhalls.amount > 0
 
     @staticmethod
     def is_position_safe(
@@ -413,29 +426,36 @@ class BaseUnit(ABC):
 
     def _find_closest_to_target(self, target_pos: Point2, grid: np.ndarray) -> Point2:
         try:
-            nearest_spot = grid[
-                np.sum(
-                    np.square(np.abs(grid - np.array([[target_pos.x, target_pos.y]]))),
-                    1,
-                ).argmin()
+            nearest_spot: np.ndarray = grid[
+                squared_distances(grid, target_pos.x, target_pos.y).argmin()
             ]
-
-            pos = Point2(Pointlike((nearest_spot[0], nearest_spot[1])))
-            return pos
+            return Point2((float(nearest_spot[0]), float(nearest_spot[1])))
         except ValueError:
             return target_pos.towards(self.bot.start_location, 1)
 
+    def _find_closest_in_frontier(
+        self, target_pos: Point2, frontier: FrontierIndex, grid: np.ndarray
+    ) -> Point2:
+        """
+        Same as `_find_closest_to_target`, but answered by a `FrontierIndex` over `grid`'s tiles
+        Falls back to searching `grid` if the index has no tiles
+        """
+        tile: Optional[Tuple[int, int]] = frontier.closest_tile(
+            target_pos.x, target_pos.y
+        )
+        if tile is None:
+            return self._find_closest_to_target(target_pos, grid)
+        return Point2((float(tile[0]), float(tile[1])))
+
     @staticmethod
     def get_random_position_from(from_position: Point2, distance: int):
         """Start at a position and get a random new position `distance` away"""
-        angle: int = randint(0, 360)
-        return from_position + (distance * Point2((cos(angle), sin(angle))))
+        return Point2(random_ring_point(from_position.x, from_position.y, distance))
 
     def position_blocks_expansion(self, position: Point2) -> bool:
-        """Will the creep tumor block expansion"""
-        blocks_expansion: bool = False
-        for expansion in self.bot.expansion_locations_list:
-            if position.distance_to(expansion) < 5.0:
-                blocks_expansion = True
-                break
-        return blocks_expansion
+        """Will the creep tumor block expansion, see `FrameContext.expansion_blocking_mask`"""
+        return FrameContext.for_bot(self.bot).position_blocks_expansion(position)
+
+    def positions_block_expansion(self, positions: np.ndarray) -> np.ndarray:
+        """`position_blocks_expansion` for an (n, 2) array of positions"""
+        return FrameContext.for_bot(self.bot).positions_block_expansion(positions)
@@ -1,5 +1,4 @@
-import functools
-from typing import Dict, List, Optional, Set, Tuple, Union
+from typing import Dict, Hashable, List, Optional, Set, Tuple, Union
 
 import numpy as np
 from loguru import logger
@@ -11,61 +10,83 @@ from sc2.position import Point2
 from sc2.unit import Unit
 from sc2.units import Units
 
-from queens_sc2.kd_trees import KDTrees
+from queens_sc2.cache import invalidate_frame_cache, method_cache_once_per_frame
+from queens_sc2.creep_grid import CreepGrid
+from queens_sc2.frame_context import FrameContext
+from queens_sc2.geometry import (
+    in_bounds,
+    neighbors8,
+    points_towards,
+    random_ring_point,
+    tumor_grid_position,
+)
+from queens_sc2.kd_trees import ENEMY_GROUND_TREE, KDTrees
 from queens_sc2.policy import Policy
 from queens_sc2.queen_control.base_unit import BaseUnit
+from queens_sc2.tag_state import TagState
+from queens_sc2.tumor_raster import TumorRaster
 
-ALL_TUMOR_TYPES: Set[UnitID] = {
-    UnitID.CREEPTUMORBURROWED,
-    UnitID.CREEPTUMORQUEEN,
-    UnitID.CREEPTUMOR,
-}
 TARGETED_CREEP_SPREAD: str = "TARGETED"
 TIME_TO_CLEAR_PENDING_CREEP_POSITION: int = 10
 # 11 seconds before a tumor can be spread again (after it's finished building)
 TUMOR_COOLDOWN: int = int(11 * 22.4) + 7
+# ordered tumor positions are forgotten after this long if no tumor is there
+TUMOR_POSITION_TIMEOUT: float = 30.0
 
 
 class Creep(BaseUnit):
-    creep_map: np.ndarray
-    no_creep_map: np.ndarray
-
     def __init__(
         self,
         bot: BotAI,
         kd_trees: KDTrees,
         creep_policy: Policy,
         map_data: Optional["MapData"],
+        creep_grid: Optional[CreepGrid] = None,
     ):
         super().__init__(bot, kd_trees, map_data)
         self.policy = creep_policy
+        # may be shared with other `Creep` controllers, see `FrameContext`
+        self.creep_grid: CreepGrid = creep_grid if creep_grid else CreepGrid(bot)
         self.creep_targets: List[Point2] = []
         self.creep_target_index: int = 0
         pathable: np.ndarray = np.where(self.bot.game_info.pathing_grid.data_numpy == 1)
         self.pathing_tiles: np.ndarray = np.vstack(
             (pathable[1], pathable[0])
         ).transpose()
-        self.used_tumors: Set[int] = set()
+        # per tumor records, pruned as tumors die
+        self.tag_state: TagState = TagState(bot)
+        self.used_tumors: Set[int] = self.tag_state.new_set("used_tumors")
         self.first_tumor: bool = True
         self.first_tumor_retry_attempts: int = 0
         # keep track of positions where queen is on route to lay a tumor
         # tuple where first element is position, and second the time it was added so we can clear it out if need be
         self.pending_positions: List[Tuple[Point2, float]] = []
-        self.active_tumors: Dict[int:float] = dict()
-        self.tumors_cooldown: Dict[int:int] = dict()
-        self.tumor_positions: Set[Point2] = set()
+        self.active_tumors: Dict[int, float] = self.tag_state.new_dict("active_tumors")
+        self.tumors_cooldown: Dict[int, int] = self.tag_state.new_dict(
+            "tumors_cooldown"
+        )
+        # key: position a tumor was ordered at, value: time it was ordered
+        self.tumor_positions: Dict[Point2, float] = {}
         self.tumors: Units = Units([], bot)
+        # tumors, ordered and pending tumors stamped on the map, for the spacing checks
+        self.tumor_raster: TumorRaster = TumorRaster(
+            self.bot.game_info.pathing_grid.data_numpy.shape,
+            self.policy.distance_between_queen_tumors or 0,
+        )
+        self._raster_tumors: Optional[Units] = None
 
     @property
-    @functools.lru_cache()
-    def creep_coverage(self) -> float:
-        if self.creep_map is not None:
-            creep_coverage: int = self.creep_map.shape[0]
-            no_creep_coverage: int = self.no_creep_map.shape[0]
-            total_tiles: int = creep_coverage + no_creep_coverage
-            return 100 * creep_coverage / total_tiles
+    def creep_map(self) -> np.ndarray:
+        return self.creep_grid.creep_map
+
+    @property
+    def no_creep_map(self) -> np.ndarray:
+        return self.creep_grid.no_creep_map
 
-        return 0.0
+    @property
+    def creep_coverage(self) -> float:
+        """Percentage of pathable tiles with creep, as of the last `update_creep_map`"""
+        return self.creep_grid.creep_coverage
 
     def handle_unit(
         self,
@@ -82,7 +103,7 @@ class Creep(BaseUnit):
         nydus_canals: Optional[Units] = None,
         natural_position: Optional[Point2] = None,
     ) -> None:
-        self.tumors = self.bot.structures(ALL_TUMOR_TYPES)
+        self.tumors = FrameContext.for_bot(self.bot).unit_registry.tumors
 
         should_spread_creep: bool = self._check_queen_can_spread_creep(unit)
         self.creep_targets = self.policy.creep_targets
@@ -92,9 +113,7 @@ class Creep(BaseUnit):
         min_priority: int = 2 if should_spread_creep else 1
         if priority_enemy_units and priority_enemy_units.amount >= min_priority:
             self.do_queen_micro(unit, priority_enemy_units, grid)
-        elif self.bot.enemy_units and self.kd_trees.get_enemies_in_attack_range_of(
-            unit
-        ):
+        elif self.bot.enemy_units and self.kd_trees.any_enemy_in_attack_range_of(unit):
             self.do_queen_micro(
                 unit, self.bot.enemy_units, grid, attack_static_defence=False
             )
@@ -151,6 +170,8 @@ class Creep(BaseUnit):
 
     def update_policy(self, policy: Policy) -> None:
         self.policy = policy
+        self.tumor_raster.set_radius(self.policy.distance_between_queen_tumors or 0)
+        invalidate_frame_cache(self)
 
     def _check_queen_can_spread_creep(self, queen: Unit) -> bool:
         return queen.energy >= 25 and self.policy.prioritize_creep()
@@ -183,25 +204,23 @@ class Creep(BaseUnit):
         # if using map_data, creep will follow ground path to the targets
         if self.map_data:
             pos: Optional[Point2] = self._find_closest_to_target_using_path(
-                creep_target, self.creep_map, grid
+                creep_target, grid
             )
         else:
-            pos: [Point2] = self._find_closest_to_target(creep_target, self.creep_map)
+            pos: Point2 = self._find_closest_in_frontier(
+                creep_target, self.creep_grid.creep_frontier, self.creep_map
+            )
             # check this position is good, if not try to find something nearby
             if not self._valid_creep_placement(pos):
-                new_pos: Optional[Point2] = None
-                for p in pos.neighbors8:
-                    if self._valid_creep_placement(p):
-                        new_pos = p
-                        break
-                pos = new_pos
-
-        if pos and not self.kd_trees.enemy_units_in_range_of_point(
-            queen.position, 11
-        ).filter(lambda u: not u.is_flying):
+                pos = self._first_valid_placement(neighbors8(pos.x, pos.y))
+
+        if pos and not self.kd_trees.any_in_range_of_point(
+            ENEMY_GROUND_TREE, queen.position, 11
+        ):
             queen(AbilityId.BUILD_CREEPTUMOR_QUEEN, pos)
-            self._add_tumor_position(pos)
             self.pending_positions.append((pos, self.bot.time))
+            self.tumor_raster.add("pending", (pos, self.bot.time), pos.x, pos.y)
+            self._add_tumor_position(pos)
 
         # can't lay tumor right now, go back home
         elif queen.distance_to(self.policy.rally_point) > 7:
@@ -254,47 +273,64 @@ class Creep(BaseUnit):
         queen_tumors = self.tumors({UnitID.CREEPTUMORQUEEN})
 
         # recreate the pending position list, depending on if a tumor has been placed closeby
+        # or the queen has had long enough to get there
         self.pending_positions = [
             pending_position
             for pending_position in self.pending_positions
             if not queen_tumors.closer_than(3, pending_position[0])
             and self.bot.time
-            > pending_position[1] + TIME_TO_CLEAR_PENDING_CREEP_POSITION
+            <= pending_position[1] + TIME_TO_CLEAR_PENDING_CREEP_POSITION
         ]
+        self._sync_tumor_raster(
+            "pending",
+            {
+                pending_position: (pending_position[0].x, pending_position[0].y)
+                for pending_position in self.pending_positions
+            },
+            excludes=True,
+        )
 
     def _find_existing_tumor_placement(self, from_pos: Point2) -> Optional[Point2]:
         # find closest no creep tile that is in pathing grid
-        target: Point2 = self._find_closest_to_target(from_pos, self.no_creep_map)
+        target: Point2 = self._find_closest_in_frontier(
+            from_pos, self.creep_grid.no_creep_frontier, self.no_creep_map
+        )
 
         # start at possible placement area, and move back till we find a spot
-        for i, x in enumerate(
-            range(
-                self.policy.min_distance_between_existing_tumors,
-                self.policy.distance_between_existing_tumors,
-            )
-        ):
-            new_pos: Point2 = from_pos.towards(
-                target, self.policy.distance_between_existing_tumors - i
-            )
-            if self._valid_creep_placement(new_pos):
-                return new_pos
+        distances: np.ndarray = np.arange(
+            self.policy.distance_between_existing_tumors,
+            self.policy.min_distance_between_existing_tumors,
+            -1,
+        )
+        return self._first_valid_placement(
+            points_towards(from_pos.x, from_pos.y, target.x, target.y, distances)
+        )
 
     def _find_random_creep_placement(
         self, from_pos: Point2, distance: int
     ) -> Optional[Point2]:
-        random_position: Point2 = self.get_random_position_from(from_pos, distance)
+        x, y = random_ring_point(from_pos.x, from_pos.y, distance)
+        if not self.bot.in_map_bounds((x, y)):
+            return None
         # go backwards towards tumor till position is found
-        for i in range(8):
-            if not self.bot.in_map_bounds(random_position):
-                continue
-            creep_pos: Point2 = random_position.towards(from_pos, distance=i)
-            if self._valid_creep_placement(creep_pos):
-                return creep_pos
+        return self._first_valid_placement(
+            points_towards(x, y, from_pos.x, from_pos.y, np.arange(8))
+        )
+
+    def _first_valid_placement(self, candidates: np.ndarray) -> Optional[Point2]:
+        """
+        First of `candidates` a tumor can be placed at, in order
+        @param candidates: (n, 2) array of positions
+        """
+        valid: np.ndarray = self._valid_creep_placements(candidates)
+        if not valid.any():
+            return None
+        x, y = candidates[valid.argmax()].tolist()
+        return Point2((x, y))
 
     def _find_closest_to_target_using_path(
         self,
         target_pos: Union[Point2, Tuple[Point2, Point2]],
-        creep_grid: np.ndarray,
         pathing_grid: np.ndarray,
     ) -> Optional[Point2]:
         # just a list of targets, we path from start location to target
@@ -325,70 +361,116 @@ class Creep(BaseUnit):
             for point in path:
                 if not self.bot.has_creep(point):
                     # then get closest creep tile, to this no creep tile
-                    new_placement: Point2 = self._find_closest_to_target(
-                        point, creep_grid
+                    new_placement: Point2 = self._find_closest_in_frontier(
+                        point, self.creep_grid.creep_frontier, self.creep_map
                     )
                     # check this position is valid
                     if not self._valid_creep_placement(new_placement):
                         # last resort, find something nearby
-                        for pos in new_placement.neighbors8:
-                            if self._valid_creep_placement(pos):
-                                return pos
+                        return self._first_valid_placement(
+                            neighbors8(new_placement.x, new_placement.y)
+                        )
                     else:
                         return new_placement
-                    break
 
     def update_creep_map(self) -> None:
-        creep: np.ndarray = np.where(self.bot.state.creep.data_numpy == 1)
-        self.creep_map = np.vstack((creep[1], creep[0])).transpose()
-        no_creep: np.ndarray = np.where(
-            (self.bot.state.creep.data_numpy == 0)
-            & (self.bot.game_info.pathing_grid.data_numpy == 1)
+        self.creep_grid.update()
+
+    def prune_state(self) -> None:
+        """
+        Drop records of tumors that no longer exist, see `TagState`
+        Ordered tumor positions are dropped once they're old enough that the tumor should exist,
+        and no tumor is there
+        """
+        if not self.tag_state.sweep():
+            return
+        tumor_positions: Set[Tuple[float, float]] = {
+            tumor.position_tuple for tumor in self.tumors
+        }
+        expire_before: float = self.bot.time - TUMOR_POSITION_TIMEOUT
+        self.tumor_positions = {
+            position: time_added
+            for position, time_added in self.tumor_positions.items()
+            if time_added > expire_before or position in tumor_positions
+        }
+        self._sync_tumor_raster(
+            "ordered",
+            {position: (position.x, position.y) for position in self.tumor_positions},
+            excludes=False,
         )
-        self.no_creep_map = np.vstack((no_creep[1], no_creep[0])).transpose()
+
+    def state_sizes(self) -> Dict[str, int]:
+        """Number of records kept in each per tumor structure"""
+        sizes: Dict[str, int] = self.tag_state.sizes()
+        sizes["tumor_positions"] = len(self.tumor_positions)
+        sizes["pending_positions"] = len(self.pending_positions)
+        sizes["tumor_raster"] = self.tumor_raster.amount
+        return sizes
 
     def set_rally_point(self, rally_point: Point2) -> None:
         self.policy.rally_point = rally_point
 
     def _existing_tumors_too_close(self, position: Point2) -> bool:
-        """Using the policy option, check if other tumors are too close"""
-        min_distance: int = self.policy.distance_between_queen_tumors
+        """
+        Using the policy option, check if other tumors are too close
+        Tumors and pending creep locations (queen on route to lay tumor) are stamped on
+        `tumor_raster`, so this is a single lookup
+        """
         # passing 0 or False value into the policy will turn this check off and save computation
-        if not min_distance:
+        if not self.policy.distance_between_queen_tumors:
             return False
+        self._update_tumor_raster()
+        return self.tumor_raster.is_excluded(position.x, position.y)
+
+    def _existing_tumors_too_close_mask(self, positions: np.ndarray) -> np.ndarray:
+        """`_existing_tumors_too_close` for an (n, 2) array of positions"""
+        if not self.policy.distance_between_queen_tumors:
+            return np.zeros(positions.shape[0], dtype=bool)
+        self._update_tumor_raster()
+        return self.tumor_raster.excluded_mask(positions)
+
+    def _update_tumor_raster(self) -> None:
+        """Stamp new tumors and clear dead ones, once each time `self.tumors` changes"""
+        if self.tumors is self._raster_tumors:
+            return
+        self._raster_tumors = self.tumors
+        self._sync_tumor_raster(
+            "tumor",
+            {tumor.tag: tumor.position_tuple for tumor in self.tumors},
+            excludes=True,
+        )
 
-        for tumor in self.tumors:
-            if position.distance_to(tumor) < min_distance:
-                return True
-
-        # check in the pending creep locations (queen on route to lay tumor)
-        for pending_position in self.pending_positions:
-            if position.distance_to(pending_position[0]) < min_distance:
-                return True
-
-        return False
+    def _sync_tumor_raster(
+        self,
+        group: str,
+        positions: Dict[Hashable, Tuple[float, float]],
+        excludes: bool,
+    ) -> None:
+        """`TumorRaster.sync`, dropping placement checks made before the raster changed"""
+        if self.tumor_raster.sync(group, positions, excludes):
+            invalidate_frame_cache(self, "_valid_creep_placement")
 
     def _add_tumor_position(self, position: Point2) -> None:
-        def round_position(pos: float, base=0.5) -> float:
-            return base * round(pos / base)
-
-        x: float = round_position(position.x)
-        if int(x * 10) % 10 == 0:
-            x += 0.5
-        y: float = round_position(position.y)
-        if int(y * 10) % 10 == 0:
-            y += 0.5
-        pos: Point2 = Point2((x, y))
-        self.tumor_positions.add(pos)
-
+        pos: Point2 = Point2(tumor_grid_position(position.x, position.y))
+        self.tumor_positions[pos] = self.bot.time
+        self.tumor_raster.add("ordered", pos, pos.x, pos.y, excludes=False)
+        # earlier placement checks this frame didn't know about this tumor
+        invalidate_frame_cache(self, "_valid_creep_placement")
+
+    def _tumor_ordered_at(self, position: Point2) -> bool:
+        """Is there a tumor, or one ordered or pending, on the tile a tumor at `position` would use"""
+        self._update_tumor_raster()
+        return self.tumor_raster.is_occupied(position.x, position.y)
+
+    # tumors are placed on a half tile grid
+    @method_cache_once_per_frame(resolution=0.5)
     def _valid_creep_placement(self, position: Point2) -> bool:
         placeable: bool = self.bot.game_info.placement_grid[position.rounded] == 1
         return (
             placeable
             and self.bot.is_visible(position)
             and self.bot.has_creep(position)
-            and position not in self.tumor_positions
-            and position not in self.pending_positions
+            and not self._tumor_ordered_at(position)
             and (
                 self.policy.should_tumors_block_expansions is False
                 and not self.position_blocks_expansion(position)
@@ -397,3 +479,44 @@ class Creep(BaseUnit):
             and not self._existing_tumors_too_close(position)
             and not self.position_near_enemy(position)
         )
+
+    def _valid_creep_placements(self, candidates: np.ndarray) -> np.ndarray:
+        """
+        `_valid_creep_placement` for an (n, 2) array of candidates, as a boolean mask
+        Candidates are snapped to the half tile grid like the single position check,
+        grid checks are array lookups and the distance checks run for all remaining candidates at once
+        """
+        valid: np.ndarray = np.zeros(candidates.shape[0], dtype=bool)
+        # same as `_valid_creep_placement`, nothing is valid unless this is False
+        if (
+            candidates.shape[0] == 0
+            or self.policy.should_tumors_block_expansions is not False
+        ):
+            return valid
+        positions: np.ndarray = np.round(candidates / 0.5) * 0.5
+
+        placement_grid: np.ndarray = self.bot.game_info.placement_grid.data_numpy
+        height, width = placement_grid.shape
+        valid = in_bounds(positions, width, height)
+        xs: np.ndarray = np.floor(positions[valid, 0]).astype(int)
+        ys: np.ndarray = np.floor(positions[valid, 1]).astype(int)
+        valid[valid] = (
+            (placement_grid[ys, xs] == 1)
+            & (self.bot.state.visibility.data_numpy[ys, xs] == 2)
+            & (self.bot.state.creep.data_numpy[ys, xs] == 1)
+        )
+        if valid.any():
+            self._update_tumor_raster()
+            valid[valid] = ~self.tumor_raster.occupied_mask(positions[valid])
+
+        # the distance checks, cheapest first and only for candidates still valid
+        for check in (
+            self.positions_block_expansion,
+            self.positions_near_enemy_townhall,
+            self._existing_tumors_too_close_mask,
+            self.positions_near_enemy,
+        ):
+            if not valid.any():
+                break
+            valid[valid] = ~check(positions[valid])
+        return valid
@@ -7,6 +7,8 @@ from sc2.position import Point2
 from sc2.unit import Unit
 from sc2.units import Units
 
+from queens_sc2.frame_context import FrameContext
+from queens_sc2.geometry import in_bounds, random_ring_points
 from queens_sc2.kd_trees import KDTrees
 from queens_sc2.queen_control.base_unit import BaseUnit
 from queens_sc2.policy import Policy
@@ -260,25 +262,27 @@ class CreepDropperlord(BaseUnit):
             self.creep_target_index = 0
 
         target_area: Point2 = self.creep_targets[self.creep_target_index]
-        for i in range(50):
-            random_target: Point2 = self.get_random_position_from(
-                from_position=target_area, distance=8
-            )
+        candidates: np.ndarray = random_ring_points(target_area.x, target_area.y, 8, 50)
+        # same height as the target area and pathable, checked for all candidates at once
+        terrain_height: np.ndarray = self.bot.game_info.terrain_height.data_numpy
+        height, width = terrain_height.shape
+        candidates = candidates[in_bounds(candidates, width, height)]
+        xs, ys = candidates.astype(int).T
+        target_height: int = terrain_height[int(target_area.y), int(target_area.x)]
+        candidates = candidates[
+            (terrain_height[ys, xs] == target_height)
+            & (self.bot.game_info.pathing_grid.data_numpy[ys, xs] == 1)
+        ]
+        for x, y in candidates.tolist():
+            random_target: Point2 = Point2((x, y))
             if (
                 self.map_data
                 and not self.is_position_safe(grid, random_target)
                 and not self.is_position_safe(air_grid, random_target)
             ):
                 continue
-            if self.bot.get_terrain_z_height(
-                random_target
-            ) == self.bot.get_terrain_z_height(
-                target_area
-            ) and self.bot.in_pathing_grid(
-                random_target
-            ):
-                self.current_creep_target = random_target
-                return
+            self.current_creep_target = random_target
+            return
 
         # in case we found nothing at all
         return self.bot.game_info.map_center
@@ -292,8 +296,10 @@ class CreepDropperlord(BaseUnit):
             if self.map_data and not self.is_position_safe(grid, position):
                 return False
             # if there is no creep nearby, then we determine there is no creep in this area
-            closest_creep_tile: Point2 = self._find_closest_to_target(
-                position, self.creep_map
+            closest_creep_tile: Point2 = self._find_closest_in_frontier(
+                position,
+                FrameContext.for_bot(self.bot).creep_grid.creep_frontier,
+                self.creep_map,
             )
             if closest_creep_tile.distance_to(position) > 12:
                 return True
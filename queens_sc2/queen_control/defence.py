@@ -48,7 +48,7 @@ class Defence(BaseUnit):
             self.do_queen_offensive_micro(unit, self.policy.attack_target, queens)
         elif (
             self.bot.enemy_units
-            and self.kd_trees.get_enemies_in_attack_range_of(unit)
+            and self.kd_trees.any_enemy_in_attack_range_of(unit)
             and (ground_threats_near_bases or air_threats_near_bases)
         ):
             self.do_queen_micro(
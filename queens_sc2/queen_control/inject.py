@@ -57,12 +57,7 @@ class Inject(BaseUnit):
                     unit, air_threats_near_bases, grid, attack_static_defence=False
                 )
             else:
-                in_attack_range: Units = self.kd_trees.get_enemies_in_attack_range_of(
-                    unit
-                )
-                target: Optional[Unit] = None
-                if in_attack_range:
-                    target = self.get_target_from_in_range_enemies(in_attack_range)
+                target: Optional[Unit] = self.get_target_in_attack_range_of(unit)
 
                 if target and self.attack_ready(unit, target):
                     unit.attack(target)
@@ -9,7 +9,7 @@ from sc2.units import Units
 import numpy as np
 
 from queens_sc2.kd_trees import KDTrees
-from queens_sc2.cache import property_cache_once_per_frame
+from queens_sc2.cache import invalidate_frame_cache, property_cache_once_per_frame
 from queens_sc2.queen_control.base_unit import BaseUnit
 from queens_sc2.policy import Policy
 
@@ -99,9 +99,12 @@ class Nydus(BaseUnit):
 
     def set_nydus_target(self, nydus_target: Point2) -> None:
         self.policy.nydus_target = nydus_target
+        # cached units near the old target are no longer valid
+        invalidate_frame_cache(self)
 
     def update_policy(self, policy: Policy) -> None:
         self.policy = policy
+        invalidate_frame_cache(self)
 
     def _manage_nydus_attack(
         self,
@@ -1,5 +1,4 @@
 from typing import DefaultDict, Dict, List, Optional, Set, Tuple, Union
-from collections import defaultdict
 import numpy as np
 
 from sc2.bot_ai import BotAI
@@ -8,7 +7,6 @@ from sc2.ids.unit_typeid import UnitTypeId as UnitID
 from sc2.position import Point2, Point3
 from sc2.unit import Unit
 from sc2.units import Units
-from queens_sc2.cache import property_cache_once_per_frame
 from queens_sc2.consts import (
     CREEP_POLICY,
     CREEP_DROPPERLORD_POLICY,
@@ -16,15 +14,18 @@ from queens_sc2.consts import (
     INJECT_POLICY,
     NYDUS_POLICY,
     QueenRoles,
-    UNITS_TO_TRANSFUSE,
+    UNITS_TO_TRANSFUSE_LUT,
+    type_id_mask,
 )
-from queens_sc2.kd_trees import KDTrees
+from queens_sc2.frame_context import FrameContext
+from queens_sc2.kd_trees import BACKEND_KDTREE, OWN_TREE, KDTrees
 from queens_sc2.queen_control.base_unit import BaseUnit
 from queens_sc2.queen_control.creep import Creep
 from queens_sc2.queen_control.creep_dropperlord import CreepDropperlord
 from queens_sc2.queen_control.defence import Defence
 from queens_sc2.queen_control.inject import Inject
 from queens_sc2.queen_control.nydus import Nydus
+from queens_sc2.tag_state import TagState
 from queens_sc2.policy import (
     DefenceQueen,
     CreepQueen,
@@ -86,8 +87,24 @@ class Queens:
         queen_policy: Dict = None,
         map_data: Optional["MapData"] = None,
         control_canal: bool = True,
+        spatial_backend: str = BACKEND_KDTREE,
+        incremental_spatial_index: bool = False,
+        spatial_query_resolution: float = 0.0,
+        enemy_memory_seconds: float = 0.0,
+        raw_observation: bool = False,
+        incremental_creep_map: bool = False,
     ):
-        self.kd_trees: KDTrees = KDTrees(bot)
+        # shared with any other `Queens` on this bot, the first one created sets the options
+        self.frame_context: FrameContext = FrameContext.for_bot(
+            bot,
+            spatial_backend=spatial_backend,
+            incremental_spatial_index=incremental_spatial_index,
+            spatial_query_resolution=spatial_query_resolution,
+            enemy_memory_seconds=enemy_memory_seconds,
+            raw_observation=raw_observation,
+            incremental_creep_map=incremental_creep_map,
+        )
+        self.kd_trees: KDTrees = self.frame_context.kd_trees
         self.bot: BotAI = bot
         self.debug: bool = debug
         self.assigned_queen_tags: Set[int] = set()
@@ -100,7 +117,11 @@ class Queens:
 
         self.policies: Dict[str, Policy] = self._read_queen_policy(queen_policy)
         self.creep: Creep = Creep(
-            bot, self.kd_trees, self.policies[CREEP_POLICY], map_data
+            bot,
+            self.kd_trees,
+            self.policies[CREEP_POLICY],
+            map_data,
+            creep_grid=self.frame_context.creep_grid,
         )
         self.creep_dropperlord: CreepDropperlord = CreepDropperlord(
             bot, self.kd_trees, self.policies[CREEP_DROPPERLORD_POLICY], map_data
@@ -115,10 +136,16 @@ class Queens:
             bot, self.kd_trees, self.policies[NYDUS_POLICY], map_data
         )
         self.transfuse_dict: Dict[int] = {}
+        # queens that are gone lose their role, in case `remove_unit` was never called for them
+        self.tag_state: TagState = TagState(bot, on_swept=self.remove_unit)
         # key: unit tag, value: when to expire so unit can be transfused again
-        self.targets_being_transfused: Dict[int, float] = {}
+        self.targets_being_transfused: Dict[
+            int, float
+        ] = self.tag_state.new_dict("targets_being_transfused")
         self.creep.update_creep_map()
-        self.unit_controllers: DefaultDict[int, BaseUnit] = defaultdict(BaseUnit)
+        self.unit_controllers: DefaultDict[int, BaseUnit] = self.tag_state.new_dict(
+            "unit_controllers", BaseUnit
+        )
         self.map_data: Optional["MapData"] = map_data
         # if user is using MapData but doesn't pass an argument for a certain grid
         # save a cached version so it's only calculated the one time rather then every frame
@@ -127,13 +154,13 @@ class Queens:
         self.cached_ground_grid: Optional[np.ndarray] = None
         self.cached_avoidance_grid: Optional[np.ndarray] = None
 
-    @property_cache_once_per_frame
+    @property
     def nydus_canals(self) -> Units:
-        return self.bot.structures(UnitID.NYDUSCANAL)
+        return self.frame_context.nydus_canals
 
-    @property_cache_once_per_frame
+    @property
     def nydus_networks(self) -> Units:
-        return self.bot.structures(UnitID.NYDUSNETWORK)
+        return self.frame_context.nydus_networks
 
     async def manage_queens(
         self,
@@ -164,7 +191,7 @@ class Queens:
             @param creep_queen_dropperlord_tags: Dropperlord unit tags that queens-sc2 can steal and use
                                             Ensure creep dropperlord is enabled in the policy
         """
-        self.kd_trees.update()
+        self.frame_context.update()
         if self.defence.policy.pass_own_threats:
             air_threats: Units = air_threats_near_bases
             ground_threats: Units = ground_threats_near_bases
@@ -188,13 +215,14 @@ class Queens:
                 avoidance_grid = self.cached_avoidance_grid
 
         if queens is None:
-            queens: Units = self.bot.units(UnitID.QUEEN)
+            queens: Units = self.frame_context.unit_registry.queens
 
-        if iteration % 8 == 0:
-            self.creep.update_creep_map()
+        self.tag_state.sweep()
+        self.creep.prune_state()
 
-        if iteration % 128 == 0:
-            Creep.creep_coverage.fget.cache_clear()
+        # incremental updates only cost the tiles that changed, so they can run every frame
+        if self.frame_context.creep_grid.incremental or iteration % 8 == 0:
+            self.creep.update_creep_map()
 
         if (
             self.creep.creep_coverage < 50
@@ -239,12 +267,16 @@ class Queens:
             if self.inject_targets[k] == unit_tag:
                 del self.inject_targets[k]
                 # also assign the dead townhall's queen a new role if she is alive
-                queens: Units = self.bot.units(UnitID.QUEEN).tags_in([k])
+                queens: Units = self.frame_context.unit_registry.queens.tags_in([k])
                 if queens:
                     self.assigned_queen_tags.remove(queens.first.tag)
                     self._assign_queen_role(queens.first)
         if unit_tag in self.assigned_queen_tags:
             self.assigned_queen_tags.remove(unit_tag)
+        if self.kd_trees.enemy_memory is not None:
+            self.kd_trees.enemy_memory.forget(unit_tag)
+        self.tag_state.remove_tag(unit_tag)
+        self.creep.tag_state.remove_tag(unit_tag)
 
         # dropperlord tags
         if unit_tag in self.creep_dropperlod_tags:
@@ -254,6 +286,40 @@ class Queens:
             self.creep_dropperlord.dropperlord_tag = 0
             self.creep_dropperlod_tags = []
 
+    def on_unit_created(self, unit: Unit) -> None:
+        """Call from the bot's `on_unit_created`, keeps the queen and townhall registry up to date"""
+        self.frame_context.unit_registry.on_unit_created(unit)
+
+    def on_building_construction_started(self, unit: Unit) -> None:
+        """Call from the bot's `on_building_construction_started`, registers tumors and nyduses"""
+        self.frame_context.unit_registry.on_building_construction_started(unit)
+
+    def on_building_construction_complete(self, unit: Unit) -> None:
+        """Call from the bot's `on_building_construction_complete`"""
+        self.frame_context.unit_registry.on_building_construction_complete(unit)
+
+    def on_unit_type_changed(self, unit: Unit, previous_type: UnitID) -> None:
+        """Call from the bot's `on_unit_type_changed`, ie: tumors burrowing, hatcheries morphing"""
+        self.frame_context.unit_registry.on_unit_type_changed(unit, previous_type)
+
+    def on_unit_destroyed(self, unit_tag: int) -> None:
+        """Call from the bot's `on_unit_destroyed`, use instead of `remove_unit`"""
+        self.frame_context.unit_registry.on_unit_destroyed(unit_tag)
+        self.remove_unit(unit_tag)
+
+    def state_sizes(self) -> Dict[str, int]:
+        """
+        Number of entries in each per unit structure the library keeps, ie: to watch memory use
+        Dead units are pruned from these as they're destroyed, and by a periodic sweep
+        """
+        sizes: Dict[str, int] = self.tag_state.sizes()
+        sizes.update(
+            {f"creep.{name}": size for name, size in self.creep.state_sizes().items()}
+        )
+        sizes["assigned_queen_tags"] = len(self.assigned_queen_tags)
+        sizes["inject_targets"] = len(self.inject_targets)
+        return sizes
+
     def set_new_policy(self, queen_policy, reset_roles: bool = True) -> None:
         self.policies = self._read_queen_policy(queen_policy)
         if reset_roles:
@@ -298,6 +364,9 @@ class Queens:
         natural_position: Optional[Point2],
         creep_queen_dropperlord_tags: Optional[Set[int]] = None,
     ):
+        # one batched query for every queen, controllers then read their queen's
+        # result through `kd_trees.enemy_indices_in_attack_range_of` for the rest of the frame
+        self.kd_trees.query_attack_ranges(queens)
         all_close_threats: Units = air_threats + ground_threats
         creep_priority_enemy_units: Units = self._get_priority_enemy_units(
             all_close_threats, self.creep.policy
@@ -308,15 +377,23 @@ class Queens:
         inject_priority_enemy_units: Units = self._get_priority_enemy_units(
             all_close_threats, self.inject.policy
         )
-        in_range_of_rally_tags: Set[int] = self.kd_trees.own_units_in_range_of_point(
-            self.defence.policy.rally_point, 6.0
-        ).tags
+        in_range_of_rally_tags: Set[int] = self.kd_trees.snapshot.own.to_tags(
+            self.kd_trees.indices_in_range_of_point(
+                OWN_TREE, self.defence.policy.rally_point, 6.0
+            )
+        )
+        # type check on arrays first, so the rest only runs for units that can be transfused
+        own_units: Units = self.bot.all_own_units
+        own_type_ids: np.ndarray = np.fromiter(
+            (u.type_id.value for u in own_units), dtype=np.int32, count=len(own_units)
+        )
+        transfusable: List[int] = np.flatnonzero(
+            type_id_mask(UNITS_TO_TRANSFUSE_LUT, own_type_ids)
+        ).tolist()
         transfuse_targets: list[Unit] = [
             u
-            for u in self.bot.all_own_units
-            if u.health_percentage < 0.5
-            and u.tag not in self.targets_being_transfused
-            and u.type_id in UNITS_TO_TRANSFUSE
+            for u in (own_units[i] for i in transfusable)
+            if u.health_percentage < 0.5 and u.tag not in self.targets_being_transfused
         ]
 
         """ Main Queen loop """
@@ -427,7 +504,7 @@ class Queens:
         # inject, creep, defence
         # if there is a priority, assign it to the relevant group
         priorities: List[QueenRoles] = []
-        ready_townhalls: Units = self.bot.townhalls.ready
+        ready_townhalls: Units = self.frame_context.unit_registry.ready_townhalls
         ths_without_queen: Units = ready_townhalls.filter(
             lambda townhall: townhall.tag not in self.inject_targets.values()
         )
@@ -756,7 +833,7 @@ class Queens:
             color=(0, 255, 255),
         )
 
-        queens: Units = self.bot.units(UnitID.QUEEN)
+        queens: Units = self.frame_context.unit_registry.queens
         if queens:
             for queen in queens:
                 # don't use elif, to check for bugs (queen more than one role)
@@ -0,0 +1,434 @@
+from functools import lru_cache
+from itertools import chain
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Set, Union
+
+import numpy as np
+
+from sc2.bot_ai import BotAI
+from sc2.constants import (
+    IS_CLOAKED,
+    IS_PLACEHOLDER,
+    IS_REVEALED,
+    IS_VISIBLE,
+    FakeEffectID,
+)
+from sc2.ids.buff_id import BuffId
+from sc2.ids.unit_typeid import UnitTypeId as UnitID
+from sc2.position import Point2
+from sc2.unit import Unit
+from sc2.units import Units
+
+from queens_sc2.consts import (
+    ALL_STRUCTURES_LUT,
+    EXCLUDE_FROM_POS_NEAR_ENEMY_LUT,
+    GROUND_TOWNHALL_TYPES_LUT,
+    STATIC_DEFENCE_LUT,
+    type_id_lut,
+    type_id_mask,
+)
+
+# enemies that never count as a ground threat to queens
+NOT_GROUND_ATTACKER_LUT: np.ndarray = (
+    EXCLUDE_FROM_POS_NEAR_ENEMY_LUT | ALL_STRUCTURES_LUT
+)
+QUEEN_LUT: np.ndarray = type_id_lut({UnitID.QUEEN})
+
+
+# how `EnemyFrame` fields are read straight off a raw unit proto, see `RawEnemyFrame`
+# matches the `Unit` property of the same name
+PROTO_FIELD_READERS: Dict[str, Callable[[Any], Any]] = {
+    "health": lambda proto: proto.health,
+    "shield": lambda proto: proto.shield,
+    "energy": lambda proto: proto.energy,
+    "owner_id": lambda proto: proto.owner,
+    "is_cloaked": lambda proto: proto.cloak in IS_CLOAKED,
+    "is_revealed": lambda proto: proto.cloak == IS_REVEALED,
+    "is_burrowed": lambda proto: proto.is_burrowed,
+    "is_visible": lambda proto: proto.display_type == IS_VISIBLE,
+    "is_hallucination": lambda proto: proto.is_hallucination,
+}
+GRAVITON_BEAM: int = BuffId.GRAVITONBEAM.value
+# alliance value of enemy units in raw unit protos
+ENEMY_ALLIANCE: int = 4
+
+
+@lru_cache(maxsize=64)
+def _lut_for_types(types: FrozenSet[UnitID]) -> np.ndarray:
+    return type_id_lut(types)
+
+
+class UnitSnapshot:
+    """
+    Contiguous arrays describing a collection of units for a single frame
+    Index `i` of every array refers to `units[i]`, so query results
+    can be mapped back to `Unit` objects only when they are actually needed
+    """
+
+    def __init__(self, bot: BotAI, units: Union[Units, List[Unit]]) -> None:
+        self.bot: BotAI = bot
+        self.units: Union[Units, List[Unit]] = units
+        self.amount: int = len(units)
+        if self.amount:
+            self.positions: np.ndarray = np.array(
+                [unit.position_tuple for unit in units], dtype=float
+            )
+        else:
+            self.positions: np.ndarray = np.empty((0, 2), dtype=float)
+        self.tags: np.ndarray = np.fromiter(
+            (unit.tag for unit in units), dtype=np.uint64, count=self.amount
+        )
+        self.radii: np.ndarray = np.fromiter(
+            (unit.radius for unit in units), dtype=float, count=self.amount
+        )
+        self.is_flying: np.ndarray = np.fromiter(
+            (unit.is_flying for unit in units), dtype=bool, count=self.amount
+        )
+        self._type_ids: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_arrays(
+        cls,
+        bot: BotAI,
+        units: List[Unit],
+        positions: np.ndarray,
+        tags: np.ndarray,
+        radii: np.ndarray,
+        is_flying: np.ndarray,
+    ) -> "UnitSnapshot":
+        """Snapshot from arrays that were already worked out, ie: merged from earlier frames"""
+        snapshot: UnitSnapshot = cls.__new__(cls)
+        snapshot.bot = bot
+        snapshot.units = units
+        snapshot.amount = len(units)
+        snapshot.positions = positions
+        snapshot.tags = tags
+        snapshot.radii = radii
+        snapshot.is_flying = is_flying
+        snapshot._type_ids = None
+        return snapshot
+
+    @property
+    def type_ids(self) -> np.ndarray:
+        """`UnitTypeId` values, only read out of the units the first time they are needed"""
+        if self._type_ids is None:
+            self._type_ids = np.fromiter(
+                (unit.type_id.value for unit in self.units),
+                dtype=np.int32,
+                count=self.amount,
+            )
+        return self._type_ids
+
+    def type_mask(self, types: Union[Set[UnitID], np.ndarray]) -> np.ndarray:
+        """
+        True for every unit whose type is in `types`
+        @param types: a lookup table from `consts` (ie: `ALL_STRUCTURES_LUT`), or a set of types
+        """
+        if not isinstance(types, np.ndarray):
+            types = _lut_for_types(frozenset(types))
+        return type_id_mask(types, self.type_ids)
+
+    @property
+    def ground_mask(self) -> np.ndarray:
+        return ~self.is_flying
+
+    @property
+    def flying_mask(self) -> np.ndarray:
+        return self.is_flying
+
+    def to_tags(self, indices: Union[np.ndarray, List[int]]) -> Set[int]:
+        """Tags of the units at `indices`, without touching any `Unit` object"""
+        return set(self.tags[indices].tolist())
+
+    def to_units(self, indices: Union[np.ndarray, List[int]]) -> Units:
+        """Convert indices into this snapshot back into a `Units` collection"""
+        units = self.units
+        return Units([units[index] for index in indices], self.bot)
+
+
+class EnemyFrame(UnitSnapshot):
+    """
+    Enemy units for one frame, with the attributes target selection and filtering need as arrays
+    Each attribute is read out of the units the first time it's requested, then kept for the frame
+    """
+
+    def __init__(self, bot: BotAI, units: Union[Units, List[Unit]]) -> None:
+        super().__init__(bot, units)
+        self._fields: Dict[str, np.ndarray] = {}
+        # tags sorted, and the index each sorted tag is at, for `indices_of`
+        self._tag_order: Optional[np.ndarray] = None
+
+    def _field(self, name: str, dtype: type) -> np.ndarray:
+        if name not in self._fields:
+            self._fields[name] = np.fromiter(
+                (getattr(unit, name) for unit in self.units),
+                dtype=dtype,
+                count=self.amount,
+            )
+        return self._fields[name]
+
+    @property
+    def health(self) -> np.ndarray:
+        return self._field("health", float)
+
+    @property
+    def shield(self) -> np.ndarray:
+        return self._field("shield", float)
+
+    @property
+    def health_plus_shield(self) -> np.ndarray:
+        return self.health + self.shield
+
+    @property
+    def energy(self) -> np.ndarray:
+        return self._field("energy", float)
+
+    @property
+    def owner_id(self) -> np.ndarray:
+        return self._field("owner_id", np.int32)
+
+    @property
+    def is_cloaked(self) -> np.ndarray:
+        return self._field("is_cloaked", bool)
+
+    @property
+    def is_revealed(self) -> np.ndarray:
+        return self._field("is_revealed", bool)
+
+    @property
+    def is_burrowed(self) -> np.ndarray:
+        return self._field("is_burrowed", bool)
+
+    @property
+    def is_visible(self) -> np.ndarray:
+        return self._field("is_visible", bool)
+
+    @property
+    def is_hallucination(self) -> np.ndarray:
+        return self._field("is_hallucination", bool)
+
+    @property
+    def is_structure(self) -> np.ndarray:
+        return self._field("is_structure", bool)
+
+    @property
+    def can_attack_ground(self) -> np.ndarray:
+        return self._field("can_attack_ground", bool)
+
+    @property
+    def can_attack_air(self) -> np.ndarray:
+        return self._field("can_attack_air", bool)
+
+    @property
+    def ground_range(self) -> np.ndarray:
+        return self._field("ground_range", float)
+
+    @property
+    def air_range(self) -> np.ndarray:
+        return self._field("air_range", float)
+
+    def indices_of(self, units: Union[Units, List[Unit]]) -> np.ndarray:
+        """Index of each unit in this frame, -1 for units that aren't in it"""
+        if self._tag_order is None:
+            self._tag_order = np.argsort(self.tags)
+        tags: np.ndarray = np.fromiter(
+            (unit.tag for unit in units), dtype=np.uint64, count=len(units)
+        )
+        if self.amount == 0:
+            return np.full(tags.shape[0], -1, dtype=int)
+        sorted_tags: np.ndarray = self.tags[self._tag_order]
+        positions: np.ndarray = np.minimum(
+            np.searchsorted(sorted_tags, tags), self.amount - 1
+        )
+        return np.where(sorted_tags[positions] == tags, self._tag_order[positions], -1)
+
+    def attack_target_mask(
+        self, excluded_types: Union[Set[UnitID], np.ndarray]
+    ) -> np.ndarray:
+        """
+        Units a queen may chase down: not an excluded type or a structure,
+        and not cloaked or burrowed unless we can see them
+        """
+        return (
+            ~self.type_mask(excluded_types)
+            & (~self.is_cloaked | self.is_revealed)
+            & (~self.is_burrowed | self.is_visible)
+            & ~self.is_structure
+        )
+
+    def closest_index(
+        self, indices: np.ndarray, position: Union[Point2, tuple]
+    ) -> Optional[int]:
+        """Index out of `indices` of the unit closest to the position"""
+        if indices.shape[0] == 0:
+            return None
+        offsets: np.ndarray = self.positions[indices] - np.asarray(
+            position, dtype=float
+        )
+        return int(indices[np.einsum("ij,ij->i", offsets, offsets).argmin()])
+
+    def lowest_health_index(self, indices: np.ndarray) -> Optional[int]:
+        """
+        Index out of `indices` of the unit with the least health + shield, tag breaks ties
+        Flying units are preferred if there is one that isn't an overlord
+        """
+        if indices.shape[0] == 0:
+            return None
+        flying: np.ndarray = self.is_flying[indices]
+        if (flying & (self.type_ids[indices] != UnitID.OVERLORD.value)).any():
+            indices = indices[flying]
+        order: np.ndarray = np.lexsort(
+            (self.tags[indices], self.health_plus_shield[indices])
+        )
+        return int(indices[order[0]])
+
+    def center(self, indices: np.ndarray) -> Point2:
+        return Point2(self.positions[indices].mean(axis=0).tolist())
+
+
+class RawUnitSnapshot(UnitSnapshot):
+    """
+    `UnitSnapshot` read straight from the raw unit protos rather than `Unit` properties
+    `protos[i]` must be the proto `units[i]` was built from
+    """
+
+    def __init__(self, bot: BotAI, units: Units, protos: List[Any]) -> None:
+        self.bot: BotAI = bot
+        self.units: Units = units
+        self.protos: List[Any] = protos
+        self.amount: int = len(protos)
+        self.positions: np.ndarray = np.fromiter(
+            chain.from_iterable((proto.pos.x, proto.pos.y) for proto in protos),
+            dtype=float,
+            count=2 * self.amount,
+        ).reshape((self.amount, 2))
+        self.tags: np.ndarray = np.fromiter(
+            (proto.tag for proto in protos), dtype=np.uint64, count=self.amount
+        )
+        self.radii: np.ndarray = np.fromiter(
+            (proto.radius for proto in protos), dtype=float, count=self.amount
+        )
+        self.is_flying: np.ndarray = np.fromiter(
+            (proto.is_flying or GRAVITON_BEAM in proto.buff_ids for proto in protos),
+            dtype=bool,
+            count=self.amount,
+        )
+        self._type_ids: Optional[np.ndarray] = np.fromiter(
+            (proto.unit_type for proto in protos), dtype=np.int32, count=self.amount
+        )
+
+    @classmethod
+    def from_units(cls, bot: BotAI, units: Units) -> "RawUnitSnapshot":
+        """Snapshot of `units` read from the protos each `Unit` was built from"""
+        return cls(bot, units, [unit._proto for unit in units])
+
+
+class RawEnemyFrame(RawUnitSnapshot, EnemyFrame):
+    """
+    `EnemyFrame` read straight from the raw observation protos rather than `Unit` properties
+    Fields that need game data (ie: `is_structure`, weapon ranges) still go through `Unit`
+    Use `RawEnemyFrame.from_observation`, which checks the protos line up with `bot.all_enemy_units`
+    """
+
+    def __init__(self, bot: BotAI, units: Units, protos: List[Any]) -> None:
+        super().__init__(bot, units, protos)
+        self._fields: Dict[str, np.ndarray] = {}
+        self._tag_order: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_observation(cls, bot: BotAI) -> Optional["RawEnemyFrame"]:
+        """
+        Enemy protos in the order python-sc2 builds `all_enemy_units`,
+        `None` if they can't be matched up so the caller can fall back to `EnemyFrame`
+        """
+        protos: List[Any] = [
+            proto
+            for proto in bot.state.observation_raw.units
+            if proto.alliance == ENEMY_ALLIANCE
+            and not proto.is_blip
+            and proto.unit_type not in FakeEffectID
+            and proto.display_type != IS_PLACEHOLDER
+        ]
+        if len(protos) != len(bot.all_enemy_units):
+            return None
+        return cls(bot, bot.all_enemy_units, protos)
+
+    def _field(self, name: str, dtype: type) -> np.ndarray:
+        if name not in PROTO_FIELD_READERS:
+            return super()._field(name, dtype)
+        if name not in self._fields:
+            reader: Callable[[Any], Any] = PROTO_FIELD_READERS[name]
+            self._fields[name] = np.fromiter(
+                (reader(proto) for proto in self.protos),
+                dtype=dtype,
+                count=self.amount,
+            )
+        return self._fields[name]
+
+
+def ground_attacker_indices(units: UnitSnapshot) -> np.ndarray:
+    """Units that can attack ground, excluding workers, changelings and structures"""
+    candidates: np.ndarray = np.flatnonzero(~units.type_mask(NOT_GROUND_ATTACKER_LUT))
+    unit_list: Union[Units, List[Unit]] = units.units
+    can_attack_ground: np.ndarray = np.fromiter(
+        (unit_list[index].can_attack_ground for index in candidates),
+        dtype=bool,
+        count=candidates.shape[0],
+    )
+    return candidates[can_attack_ground]
+
+
+class FrameSnapshot:
+    """
+    Everything the spatial queries need for one game loop, built once in `KDTrees.update`
+    Ground / flying splits and unit categories are stored as index arrays into `enemy` / `own`
+    Categories are only worked out the first time they are requested
+    """
+
+    def __init__(self, bot: BotAI, raw_observation: bool = False) -> None:
+        self.game_loop: int = bot.state.game_loop
+        self.own: UnitSnapshot = (
+            RawUnitSnapshot.from_units(bot, bot.units)
+            if raw_observation
+            else UnitSnapshot(bot, bot.units)
+        )
+        enemy: Optional[EnemyFrame] = (
+            RawEnemyFrame.from_observation(bot) if raw_observation else None
+        )
+        self.enemy: EnemyFrame = (
+            enemy if enemy is not None else EnemyFrame(bot, bot.all_enemy_units)
+        )
+        self.enemy_ground_indices: np.ndarray = np.flatnonzero(self.enemy.ground_mask)
+        self.enemy_flying_indices: np.ndarray = np.flatnonzero(self.enemy.flying_mask)
+        self._enemy_ground_attacker_indices: Optional[np.ndarray] = None
+        self._enemy_townhall_indices: Optional[np.ndarray] = None
+        self._enemy_static_defence_indices: Optional[np.ndarray] = None
+        self._own_queen_indices: Optional[np.ndarray] = None
+
+    @property
+    def enemy_ground_attacker_indices(self) -> np.ndarray:
+        """Enemy units that can attack ground, excluding workers, changelings and structures"""
+        if self._enemy_ground_attacker_indices is None:
+            self._enemy_ground_attacker_indices = ground_attacker_indices(self.enemy)
+        return self._enemy_ground_attacker_indices
+
+    @property
+    def enemy_townhall_indices(self) -> np.ndarray:
+        if self._enemy_townhall_indices is None:
+            self._enemy_townhall_indices = np.flatnonzero(
+                self.enemy.type_mask(GROUND_TOWNHALL_TYPES_LUT)
+            )
+        return self._enemy_townhall_indices
+
+    @property
+    def enemy_static_defence_indices(self) -> np.ndarray:
+        if self._enemy_static_defence_indices is None:
+            self._enemy_static_defence_indices = np.flatnonzero(
+                self.enemy.type_mask(STATIC_DEFENCE_LUT)
+            )
+        return self._enemy_static_defence_indices
+
+    @property
+    def own_queen_indices(self) -> np.ndarray:
+        if self._own_queen_indices is None:
+            self._own_queen_indices = np.flatnonzero(self.own.type_mask(QUEEN_LUT))
+        return self._own_queen_indices
@@ -0,0 +1,139 @@
+from bisect import bisect_left
+from math import ceil, floor, inf, sqrt
+from typing import List, Tuple, Union
+
+import numpy as np
+
+
+class GridSpatialHash:
+    """
+    Uniform grid bucketing of 2D points, sized to the map
+    Exposes the subset of the scipy `KDTree` query interface that `KDTrees` uses,
+    so it can be swapped in as a backend. Single point queries only look at the handful of cells
+    overlapping the query circle, which beats the fixed overhead of scipy when there are only
+    a few dozen units. Batches of points are answered with one distance matrix over the points
+    near the batch instead
+    """
+
+    def __init__(
+        self,
+        positions: np.ndarray,
+        map_width: int,
+        map_height: int,
+        cell_size: float = 8.0,
+    ) -> None:
+        self.n: int = positions.shape[0]
+        self.cell_size: float = cell_size
+        self.columns: int = max(1, ceil(map_width / cell_size))
+        self.rows: int = max(1, ceil(map_height / cell_size))
+
+        cells: np.ndarray = (positions // cell_size).astype(np.int64)
+        np.clip(cells, 0, (self.columns - 1, self.rows - 1), out=cells)
+        cell_ids: np.ndarray = cells @ (1, self.columns)
+        order: np.ndarray = cell_ids.argsort(kind="stable")
+        # points sorted by cell, cells in a row are contiguous so a row of cells is one slice
+        # queries walk these with plain python, which is quicker than numpy for a few dozen points
+        self.order: List[int] = order.tolist()
+        self.sorted_cell_ids: List[int] = cell_ids[order].tolist()
+        self.xs: List[float] = positions[:, 0].tolist()
+        self.ys: List[float] = positions[:, 1].tolist()
+        self.positions: np.ndarray = np.asarray(positions, dtype=float)
+
+    def _cell_range(
+        self, x: float, y: float, distance: float
+    ) -> Tuple[int, int, int, int]:
+        cell_size: float = self.cell_size
+        last_column: int = self.columns - 1
+        last_row: int = self.rows - 1
+        return (
+            min(max(floor((x - distance) / cell_size), 0), last_column),
+            min(max(floor((x + distance) / cell_size), 0), last_column),
+            min(max(floor((y - distance) / cell_size), 0), last_row),
+            min(max(floor((y + distance) / cell_size), 0), last_row),
+        )
+
+    def _query_one(self, x: float, y: float, distance: float) -> List[int]:
+        column_start, column_end, row_start, row_end = self._cell_range(x, y, distance)
+        sorted_cell_ids: List[int] = self.sorted_cell_ids
+        order: List[int] = self.order
+        xs: List[float] = self.xs
+        ys: List[float] = self.ys
+        distance_squared: float = distance * distance
+        result: List[int] = []
+        for row in range(row_start, row_end + 1):
+            row_offset: int = row * self.columns
+            start: int = bisect_left(sorted_cell_ids, row_offset + column_start)
+            end: int = bisect_left(sorted_cell_ids, row_offset + column_end + 1, start)
+            for k in range(start, end):
+                index: int = order[k]
+                dx: float = xs[index] - x
+                dy: float = ys[index] - y
+                if dx * dx + dy * dy <= distance_squared:
+                    result.append(index)
+        return result
+
+    def query_ball_point(
+        self,
+        x: Union[np.ndarray, Tuple[float, float]],
+        r: Union[float, np.ndarray],
+        workers: int = 1,
+        return_length: bool = False,
+    ) -> Union[List[int], List[List[int]], int, np.ndarray]:
+        """
+        Same shape of results as `scipy.spatial.KDTree.query_ball_point`
+        `workers` is accepted for compatibility, queries are always single threaded
+        """
+        points: np.ndarray = np.asarray(x, dtype=float)
+        if points.ndim == 1:
+            result: List[int] = self._query_one(points[0], points[1], float(r))
+            return len(result) if return_length else result
+
+        radii: np.ndarray = np.broadcast_to(
+            np.asarray(r, dtype=float), (points.shape[0],)
+        )
+        in_range: np.ndarray = self._in_range_matrix(points, radii)
+        if return_length:
+            return np.count_nonzero(in_range, axis=1).astype(np.int64)
+        # split the hits, which come out ordered by query, into one list per query
+        ends: List[int] = np.cumsum(np.count_nonzero(in_range, axis=1)).tolist()
+        hits: List[int] = np.nonzero(in_range)[1].tolist()
+        return [hits[start:end] for start, end in zip([0] + ends, ends)]
+
+    def _in_range_matrix(self, points: np.ndarray, radii: np.ndarray) -> np.ndarray:
+        """
+        (queries, n) mask of which points are within each query's radius
+        With the few dozen points the grid is meant for, one distance matrix is cheaper
+        than walking the cells of every query
+        """
+        x_offsets: np.ndarray = points[:, 0, None] - self.positions[:, 0]
+        y_offsets: np.ndarray = points[:, 1, None] - self.positions[:, 1]
+        return x_offsets * x_offsets + y_offsets * y_offsets <= (radii * radii)[:, None]
+
+    def query(
+        self,
+        x: Union[np.ndarray, Tuple[float, float]],
+        distance_upper_bound: float = inf,
+    ) -> Tuple[float, int]:
+        """
+        Nearest neighbour of a single point, same as `KDTree.query` with k=1
+        Only searches within `distance_upper_bound`, returns (inf, n) if nothing is found
+        """
+        point_x, point_y = float(x[0]), float(x[1])
+        if distance_upper_bound == inf:
+            candidates: List[int] = list(range(self.n))
+        else:
+            candidates: List[int] = self._query_one(
+                point_x, point_y, distance_upper_bound
+            )
+
+        closest_distance: float = inf
+        closest_index: int = self.n
+        for index in candidates:
+            dx: float = self.xs[index] - point_x
+            dy: float = self.ys[index] - point_y
+            distance: float = sqrt(dx * dx + dy * dy)
+            if distance < closest_distance:
+                closest_distance, closest_index = distance, index
+        if closest_distance >= distance_upper_bound:
+            return inf, self.n
+        return closest_distance, closest_index
@@ -0,0 +1,98 @@
+from collections import defaultdict
+from typing import Any, Callable, Dict, Optional, Set, Union
+
+from sc2.bot_ai import BotAI
+
+from queens_sc2.consts import GAME_LOOPS_PER_SECOND
+
+TagContainer = Union[Dict[int, Any], Set[int]]
+
+
+class TagState:
+    """
+    Named dicts and sets keyed by unit tag, which drop tags of units that are gone
+    Tags are removed straight away by `remove_tag` (call on unit destroyed), and by a sweep
+    every `sweep_seconds` for anything that was missed. A tag is only swept once it has been
+    missing for `grace_seconds`, since units in a nydus or an overlord aren't visible to the bot
+    """
+
+    def __init__(
+        self,
+        bot: BotAI,
+        sweep_seconds: float = 10.0,
+        grace_seconds: float = 60.0,
+        on_swept: Optional[Callable[[int], None]] = None,
+    ) -> None:
+        """
+        @param bot: the bot object, own unit tags are read from here when sweeping
+        @param sweep_seconds: how often tags of units that don't exist are looked for
+        @param grace_seconds: how long a tag can be missing for before it is swept
+        @param on_swept: called with each tag removed by a sweep
+        """
+        self.bot: BotAI = bot
+        self.sweep_loops: int = int(sweep_seconds * GAME_LOOPS_PER_SECOND)
+        self.grace_loops: int = int(grace_seconds * GAME_LOOPS_PER_SECOND)
+        self.containers: Dict[str, TagContainer] = {}
+        # key: tag, value: game loop the tag was first found missing
+        self._missing_since: Dict[int, int] = {}
+        self._last_sweep: int = 0
+        self.on_swept: Optional[Callable[[int], None]] = on_swept
+        self.tags_removed: int = 0
+
+    def new_dict(
+        self, name: str, default_factory: Optional[Callable] = None
+    ) -> Dict[int, Any]:
+        """A dict that will be pruned, `default_factory` makes it a `defaultdict`"""
+        container: Dict[int, Any] = (
+            defaultdict(default_factory) if default_factory else {}
+        )
+        self.containers[name] = container
+        return container
+
+    def new_set(self, name: str) -> Set[int]:
+        container: Set[int] = set()
+        self.containers[name] = container
+        return container
+
+    def remove_tag(self, unit_tag: int) -> None:
+        """Remove `unit_tag` from every container"""
+        for container in self.containers.values():
+            if unit_tag in container:
+                if isinstance(container, set):
+                    container.discard(unit_tag)
+                else:
+                    del container[unit_tag]
+                self.tags_removed += 1
+        self._missing_since.pop(unit_tag, None)
+
+    def sweep(self, force: bool = False) -> bool:
+        """
+        Remove tags that have been missing for the grace period
+        Does nothing until `sweep_seconds` has passed since the last sweep, unless `force` is set
+        @return: True if a sweep was done
+        """
+        game_loop: int = self.bot.state.game_loop
+        if not force and game_loop - self._last_sweep < self.sweep_loops:
+            return False
+        self._last_sweep = game_loop
+
+        alive: Set[int] = self.bot.all_own_units.tags
+        tracked: Set[int] = set()
+        for container in self.containers.values():
+            tracked.update(container)
+
+        missing_since: Dict[int, int] = {}
+        for tag in tracked - alive:
+            since: int = self._missing_since.get(tag, game_loop)
+            if game_loop - since >= self.grace_loops:
+                self.remove_tag(tag)
+                if self.on_swept:
+                    self.on_swept(tag)
+            else:
+                missing_since[tag] = since
+        self._missing_since = missing_since
+        return True
+
+    def sizes(self) -> Dict[str, int]:
+        """Number of tags in each container"""
+        return {name: len(container) for name, container in self.containers.items()}
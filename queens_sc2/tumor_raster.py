@@ -0,0 +1,147 @@
+from math import ceil, floor
+from typing import Dict, Hashable, Set, Tuple
+
+import numpy as np
+
+from queens_sc2.geometry import in_bounds
+
+# key: stamp key, value: (x, y, excludes)
+Stamps = Dict[Hashable, Tuple[float, float, bool]]
+
+
+class TumorRaster:
+    """
+    Map sized rasters for tumor spacing checks, stamped as tumors and planned tumors come and go
+    `occupied` counts tumors on each tile, including ones that are ordered or pending
+    `excluded` is on a half tile grid (tumors are placed on half tiles), and counts the tumors
+    closer than `radius` to each position
+    Both are counts, so overlapping stamps can be removed independently
+    """
+
+    def __init__(self, map_shape: Tuple[int, int], radius: float) -> None:
+        """
+        @param map_shape: (height, width) of the map in tiles
+        @param radius: positions closer than this to an excluding stamp are excluded
+        """
+        height, width = map_shape
+        self.radius: float = radius
+        self.occupied: np.ndarray = np.zeros((height, width), dtype=np.int16)
+        self.excluded: np.ndarray = np.zeros(
+            (2 * height + 1, 2 * width + 1), dtype=np.int16
+        )
+        # key: group name, ie: "tumor", value: stamps in that group
+        self._groups: Dict[str, Stamps] = {}
+
+    @property
+    def amount(self) -> int:
+        return sum(len(stamps) for stamps in self._groups.values())
+
+    def add(
+        self, group: str, key: Hashable, x: float, y: float, excludes: bool = True
+    ) -> None:
+        """
+        Stamp a tumor at (x, y), does nothing if `key` is already stamped in `group`
+        @param excludes: also exclude positions within `radius`, else only occupy the tile
+        """
+        stamps: Stamps = self._groups.setdefault(group, {})
+        if key in stamps:
+            return
+        stamps[key] = (x, y, excludes)
+        self._stamp(x, y, excludes, 1)
+
+    def remove(self, group: str, key: Hashable) -> None:
+        stamps: Stamps = self._groups.get(group, {})
+        if key not in stamps:
+            return
+        x, y, excludes = stamps.pop(key)
+        self._stamp(x, y, excludes, -1)
+
+    def sync(
+        self, group: str, positions: Dict[Hashable, Tuple[float, float]], excludes: bool
+    ) -> bool:
+        """
+        Make the stamps in `group` match `positions`, only changed stamps are touched
+        @return: True if any stamp was added or removed
+        """
+        stamps: Stamps = self._groups.setdefault(group, {})
+        gone: Set[Hashable] = stamps.keys() - positions.keys()
+        for key in gone:
+            self.remove(group, key)
+        new: Set[Hashable] = positions.keys() - stamps.keys()
+        for key in new:
+            x, y = positions[key]
+            self.add(group, key, x, y, excludes)
+        return bool(gone or new)
+
+    def set_radius(self, radius: float) -> None:
+        """Change the exclusion radius, restamping everything if it is different"""
+        if radius == self.radius:
+            return
+        self.radius = radius
+        self.excluded.fill(0)
+        for stamps in self._groups.values():
+            for x, y, excludes in stamps.values():
+                if excludes:
+                    self._stamp_disc(x, y, 1)
+
+    def is_occupied(self, x: float, y: float) -> bool:
+        """Is there a tumor on the tile a tumor ordered at (x, y) would be placed on"""
+        tile_x, tile_y = self._tile(x), self._tile(y)
+        height, width = self.occupied.shape
+        if 0 <= tile_x < width and 0 <= tile_y < height:
+            return bool(self.occupied[tile_y, tile_x])
+        return False
+
+    def is_excluded(self, x: float, y: float) -> bool:
+        """Is (x, y), rounded to the half tile grid, closer than `radius` to a tumor"""
+        cell_x, cell_y = round(x * 2), round(y * 2)
+        height, width = self.excluded.shape
+        if 0 <= cell_x < width and 0 <= cell_y < height:
+            return bool(self.excluded[cell_y, cell_x])
+        return False
+
+    def occupied_mask(self, positions: np.ndarray) -> np.ndarray:
+        """`is_occupied` for an (n, 2) array of positions"""
+        tiles: np.ndarray = np.floor(np.round(positions * 2) / 2).astype(int)
+        return self._read(self.occupied, tiles)
+
+    def excluded_mask(self, positions: np.ndarray) -> np.ndarray:
+        """`is_excluded` for an (n, 2) array of positions"""
+        return self._read(self.excluded, np.round(positions * 2).astype(int))
+
+    @staticmethod
+    def _read(raster: np.ndarray, cells: np.ndarray) -> np.ndarray:
+        height, width = raster.shape
+        on_map: np.ndarray = in_bounds(cells, width, height)
+        found: np.ndarray = np.zeros(cells.shape[0], dtype=bool)
+        found[on_map] = raster[cells[on_map, 1], cells[on_map, 0]] > 0
+        return found
+
+    @staticmethod
+    def _tile(value: float) -> int:
+        # tile a tumor ordered here ends up on, see `geometry.tumor_grid_position`
+        return floor(round(value * 2) / 2)
+
+    def _stamp(self, x: float, y: float, excludes: bool, amount: int) -> None:
+        tile_x, tile_y = self._tile(x), self._tile(y)
+        height, width = self.occupied.shape
+        if 0 <= tile_x < width and 0 <= tile_y < height:
+            self.occupied[tile_y, tile_x] += amount
+        if excludes:
+            self._stamp_disc(x, y, amount)
+
+    def _stamp_disc(self, x: float, y: float, amount: int) -> None:
+        """Add `amount` to every half tile position closer than `radius` to (x, y)"""
+        radius: float = self.radius
+        if radius <= 0:
+            return
+        height, width = self.excluded.shape
+        x_start: int = max(ceil((x - radius) * 2), 0)
+        x_end: int = min(floor((x + radius) * 2) + 1, width)
+        y_start: int = max(ceil((y - radius) * 2), 0)
+        y_end: int = min(floor((y + radius) * 2) + 1, height)
+        if x_start >= x_end or y_start >= y_end:
+            return
+        ys, xs = np.mgrid[y_start:y_end, x_start:x_end]
+        disc: np.ndarray = (xs / 2 - x) ** 2 + (ys / 2 - y) ** 2 < radius * radius
+        self.excluded[y_start:y_end, x_start:x_end] += disc.astype(np.int16) * amount
@@ -0,0 +1,124 @@
+from typing import Dict, Optional, Set
+
+from sc2.bot_ai import BotAI
+from sc2.data import Race, race_townhalls
+from sc2.ids.unit_typeid import UnitTypeId as UnitID
+from sc2.unit import Unit
+from sc2.units import Units
+
+from queens_sc2.cache import property_cache_once_per_frame
+from queens_sc2.consts import ALL_TUMOR_TYPES
+from queens_sc2.tag_state import TagState
+
+NYDUS_TYPES: Set[UnitID] = {UnitID.NYDUSCANAL, UnitID.NYDUSNETWORK}
+
+
+class UnitRegistry:
+    """
+    Tags of own queens, townhalls, tumors and nyduses, kept up to date by python-sc2's unit events
+    Until an event has been received (the bot hasn't wired them up) every lookup falls back
+    to scanning the bot's units, same as before the registry existed
+    Lookups return `Units` for the current frame. Tags are kept until the unit is destroyed,
+    a unit that isn't visible this frame (ie: in a nydus or an overlord) is only left out of
+    this frame's lookups, and `TagState`'s grace period sweep drops tags that never come back
+    """
+
+    def __init__(self, bot: BotAI) -> None:
+        self.bot: BotAI = bot
+        # the library only plays zerg
+        self.townhall_types: Set[UnitID] = race_townhalls[Race.Zerg]
+        # set once a creation event is received, until then everything is scanned each frame
+        self.events_wired: bool = False
+        self.tag_state: TagState = TagState(bot)
+        # key: tag, value: type id, dicts keep the order units were added in
+        self.queen_tags: Dict[int, UnitID] = self.tag_state.new_dict("queens")
+        self.townhall_tags: Dict[int, UnitID] = self.tag_state.new_dict("townhalls")
+        self.tumor_tags: Dict[int, UnitID] = self.tag_state.new_dict("tumors")
+        self.nydus_tags: Dict[int, UnitID] = self.tag_state.new_dict("nyduses")
+        for unit in bot.all_own_units:
+            self._add(unit)
+
+    def _registry_for(self, type_id: UnitID) -> Optional[Dict[int, UnitID]]:
+        if type_id == UnitID.QUEEN:
+            return self.queen_tags
+        if type_id in self.townhall_types:
+            return self.townhall_tags
+        if type_id in ALL_TUMOR_TYPES:
+            return self.tumor_tags
+        if type_id in NYDUS_TYPES:
+            return self.nydus_tags
+        return None
+
+    def _add(self, unit: Unit) -> None:
+        registry: Optional[Dict[int, UnitID]] = self._registry_for(unit.type_id)
+        if registry is not None:
+            registry[unit.tag] = unit.type_id
+
+    def _remove(self, unit_tag: int) -> None:
+        self.tag_state.remove_tag(unit_tag)
+
+    def on_unit_created(self, unit: Unit) -> None:
+        self.events_wired = True
+        self._add(unit)
+
+    def on_building_construction_started(self, unit: Unit) -> None:
+        self.events_wired = True
+        self._add(unit)
+
+    def on_building_construction_complete(self, unit: Unit) -> None:
+        self.events_wired = True
+        self._add(unit)
+
+    def on_unit_type_changed(self, unit: Unit, previous_type: UnitID) -> None:
+        # ie: creep tumor burrowing, hatchery morphing to lair
+        self._remove(unit.tag)
+        self._add(unit)
+
+    def on_unit_destroyed(self, unit_tag: int) -> None:
+        self._remove(unit_tag)
+
+    @property_cache_once_per_frame
+    def _own_units_by_tag(self) -> Dict[int, Unit]:
+        return {unit.tag: unit for unit in self.bot.all_own_units}
+
+    def _resolve(self, registry: Dict[int, UnitID]) -> Units:
+        """`Units` for the tags in registry, tags with no unit this frame are skipped"""
+        self.tag_state.sweep()
+        units_by_tag: Dict[int, Unit] = self._own_units_by_tag
+        return Units(
+            [units_by_tag[tag] for tag in registry if tag in units_by_tag], self.bot
+        )
+
+    @property_cache_once_per_frame
+    def queens(self) -> Units:
+        if not self.events_wired:
+            return self.bot.units(UnitID.QUEEN)
+        return self._resolve(self.queen_tags)
+
+    @property_cache_once_per_frame
+    def townhalls(self) -> Units:
+        if not self.events_wired:
+            return self.bot.townhalls
+        return self._resolve(self.townhall_tags)
+
+    @property_cache_once_per_frame
+    def ready_townhalls(self) -> Units:
+        return self.townhalls.ready
+
+    @property_cache_once_per_frame
+    def tumors(self) -> Units:
+        if not self.events_wired:
+            return self.bot.structures(ALL_TUMOR_TYPES)
+        return self._resolve(self.tumor_tags)
+
+    @property_cache_once_per_frame
+    def nydus_canals(self) -> Units:
+        if not self.events_wired:
+            return self.bot.structures(UnitID.NYDUSCANAL)
+        return self._resolve(self.nydus_tags)(UnitID.NYDUSCANAL)
+
+    @property_cache_once_per_frame
+    def nydus_networks(self) -> Units:
+        if not self.events_wired:
+            return self.bot.structures(UnitID.NYDUSNETWORK)
+        return self._resolve(self.nydus_tags)(UnitID.NYDUSNETWORK)